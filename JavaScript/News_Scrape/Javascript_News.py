@@ -1,4 +1,5 @@
 import os
+import sys
 import cv2
 import time
 import glob
@@ -6,11 +7,15 @@ import subprocess
 import webbrowser
 import pyautogui
 import numpy as np
-from datetime import datetime, timedelta
-from urllib.parse import urlparse
+from datetime import datetime
 from bs4 import BeautifulSoup
 from PIL import ImageGrab
 
+sys.path.append('/Users/yanzhang/Coding/python_code/Modules')
+from news_url_index import window_start
+from news_history import NewsHistory
+from news_today import append_today_rows
+
 def capture_screen():
     """
     使用PIL的ImageGrab直接截取屏幕，并转换为OpenCV格式
@@ -32,38 +37,6 @@ def find_image_on_screen(template, threshold=0.9):
         return max_loc, template.shape
     return None, None
 
-def is_similar(url1, url2):
-    """
-    比较两个URL是否只在参数不同或其他细微处不同，
-    通过比较URL的scheme、netloc和path判定是否相似。
-    """
-    parsed_url1, parsed_url2 = urlparse(url1), urlparse(url2)
-    base_url1 = f"{parsed_url1.scheme}://{parsed_url1.netloc}{parsed_url1.path}"
-    base_url2 = f"{parsed_url2.scheme}://{parsed_url2.netloc}{parsed_url2.path}"
-    return base_url1 == base_url2
-
-def get_old_content(file_path, days_ago):
-    """
-    读取旧的HTML文件，获取指定天数内的数据（基于<tr><td>结构）。
-    """
-    old_content = []
-    if not os.path.exists(file_path):
-        return old_content
-
-    cutoff_date = datetime.now() - timedelta(days=days_ago)
-    with open(file_path, 'r', encoding='utf-8') as file:
-        soup = BeautifulSoup(file, 'html.parser')
-        for row in soup.find_all('tr')[1:]:  # 跳过表头
-            cols = row.find_all('td')
-            if len(cols) < 2:
-                continue
-            date_str, title = cols[0].text.strip(), cols[1].text.strip()
-            link = cols[1].find('a')['href'] if cols[1].find('a') else ''
-            date = datetime.strptime(date_str, '%Y_%m_%d_%H')
-            if date >= cutoff_date:
-                old_content.append([date_str, title, link])
-    return old_content
-
 def get_new_content_from_files(file_prefix):
     """
     读取Downloads目录下以指定前缀开头的HTML文件内容
@@ -88,75 +61,6 @@ def get_new_content_from_files(file_prefix):
                     new_content.append([date_str, title, link])
     return new_content
 
-def write_html(file_path, new_rows, old_content):
-    """
-    将新的抓取结果与旧内容写入同一个HTML文件，包含表格结构，
-    并进行完整性校验。
-    """
-    try:
-        with open(file_path, 'w', encoding='utf-8') as html_file:
-            html_file.write("<html><body><table border='1'>\n<tr><th>Date</th><th>Title</th></tr>\n")
-            for row in new_rows + old_content:
-                clickable_title = f"<a href='{row[2]}' target='_blank'>{row[1]}</a>"
-                html_file.write(f"<tr><td>{row[0]}</td><td>{clickable_title}</td></tr>\n")
-            html_file.write("</table></body></html>")
-            html_file.flush()
-            os.fsync(html_file.fileno())
-
-        # 验证完整性
-        with open(file_path, 'r', encoding='utf-8') as verify_file:
-            content = verify_file.read()
-            if not content.endswith("</table></body></html>"):
-                raise IOError("File writing verification failed")
-    except Exception as e:
-        print(f"Error writing to file: {e}")
-        raise
-
-def append_to_today_html(today_html_path, new_rows1):
-    """
-    将新增的抓取结果追加到today_eng.html文件末尾，并进行文件完整性校验
-    使用完整读取-修改-写入的安全方式，并添加错误处理和文件完整性验证。
-    """
-    try:
-        # 准备追加的内容
-        append_content = ""
-        for row in new_rows1:
-            # 确保每一行标签完整闭合
-            append_content += f"<tr><td>{row[0]}</td><td><a href='{row[2]}' target='_blank'>{row[1]}</a></td></tr>\n"
-        
-        closing_tag = "</table></body></html>"
-        
-        # 如果文件存在，则读取旧内容，去掉结束标签后重写文件
-        if os.path.exists(today_html_path):
-            with open(today_html_path, 'r', encoding='utf-8') as html_file:
-                content = html_file.read()
-            # 去除原有的关闭标签，避免重复写入
-            if closing_tag in content:
-                content = content.replace(closing_tag, "")
-            content += append_content + closing_tag
-            
-            with open(today_html_path, 'w', encoding='utf-8') as html_file:
-                html_file.write(content)
-                html_file.flush()
-                os.fsync(html_file.fileno())
-        else:
-            # 如果文件不存在，则构造新的 HTML 文件
-            with open(today_html_path, 'w', encoding='utf-8') as html_file:
-                html_file.write("<html><body><table border='1'>\n<tr><th>Date</th><th>Title</th></tr>\n")
-                html_file.write(append_content + closing_tag)
-                html_file.flush()
-                os.fsync(html_file.fileno())
-
-        # 验证文件完整性
-        with open(today_html_path, 'r', encoding='utf-8') as verify_file:
-            content = verify_file.read()
-            if not content.endswith(closing_tag):
-                raise IOError("File writing verification failed")
-                
-    except Exception as e:
-        print(f"Error writing to file: {e}")
-        raise
-
 def count_files(prefix):
     """
     计算Downloads目录中指定前缀开头的文件数量
@@ -361,41 +265,39 @@ def display_notification(message):
     applescript_code = f'display dialog "{message}" buttons {{"OK"}} default button "OK"'
     subprocess.run(['osascript', '-e', applescript_code], check=True)
 
-def process_news_source(source_name, old_file_path, today_html_path):
+def process_news_source(source_name, old_file_path, today_html_path, history):
     """
-    处理特定新闻源的数据，并更新相应文件
+    处理特定新闻源的数据，并更新历史库和today_eng.html
+    old_file_path 是旧的 site html，只在该站点第一次使用历史库时导入一次
     """
     current_datetime = datetime.now().strftime("%Y_%m_%d_%H")
 
-    # 读取旧文件内容
-    old_content = get_old_content(old_file_path, 30)
-    
-    # 获取旧文件中的链接列表(用于去重)
-    existing_links = {link for _, _, link in old_content}
+    site = source_name.lower()
+    since = window_start(30)
+
+    # 从历史库读出最近30天链接的 canonical key 索引(用于去重)，每个新链接只做一次查找
+    # 第一次运行时会把旧的 site html 导入历史库
+    history.ensure_imported(site, old_file_path)
+    url_index = history.url_index(site, since)
     
     # 从新文件中读取内容
-    new_content = get_new_content_from_files(source_name.lower())
+    new_content = get_new_content_from_files(site)
     
-    # 根据is_similar规则排重
+    # 按站点的 canonical URL 规则排重
     new_rows = []
     for date_str, title, link in new_content:
-        is_duplicate = False
-        for existing_link in existing_links:
-            if is_similar(link, existing_link):
-                is_duplicate = True
-                break
-        if not is_duplicate:
+        if not url_index.seen(link, since):
             new_rows.append([date_str, title, link])
-            existing_links.add(link)
+            url_index.add(link, current_datetime)
     
     # 根据source_name，将第一列的字符串替换为对应的名称
     # 注意：today_eng.html 的格式是 [来源, 标题, 链接]
     new_rows1 = [[source_name, title, link] for date_str, title, link in new_rows]
 
-    # 写入source.html并追加到today_eng.html
+    # 追加到历史库和today_eng.html
     if new_rows:
-        write_html(old_file_path, new_rows, old_content)
-        append_to_today_html(today_html_path, new_rows1)
+        history.append(site, new_rows)
+        append_today_rows(new_rows1, today_html_path)
         print(f"Added {len(new_rows)} new {source_name} articles to files")
     else:
         print(f"No new {source_name} content to add")
@@ -404,6 +306,7 @@ def process_news_source(source_name, old_file_path, today_html_path):
 
 if __name__ == "__main__":
     today_html_path = "/Users/yanzhang/Coding/News/today_eng.html"
+    history = NewsHistory()
     
     # 新增：处理FT
     print("\nStarting FT processing...")
@@ -411,7 +314,8 @@ if __name__ == "__main__":
     process_news_source(
         "FT", 
         "/Users/yanzhang/Coding/News/backup/site/ft.html",
-        today_html_path
+        today_html_path,
+        history
     )
 
     # 处理WSJ
@@ -420,7 +324,8 @@ if __name__ == "__main__":
     process_news_source(
         "WSJ", 
         "/Users/yanzhang/Coding/News/backup/site/wsj.html",
-        today_html_path
+        today_html_path,
+        history
     )
 
     # 处理Bloomberg
@@ -429,7 +334,8 @@ if __name__ == "__main__":
     process_news_source(
         "Bloomberg", 
         "/Users/yanzhang/Coding/News/backup/site/bloomberg.html",
-        today_html_path
+        today_html_path,
+        history
     )
 
     # 处理Reuters
@@ -438,7 +344,9 @@ if __name__ == "__main__":
     process_news_source(
         "Reuters", 
         "/Users/yanzhang/Coding/News/backup/site/reuters.html",
-        today_html_path
+        today_html_path,
+        history
     )
 
+    history.close()
     print("\nAll news sources processed.")
\ No newline at end of file
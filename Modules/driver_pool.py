@@ -0,0 +1,217 @@
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+
+CHROME_DRIVER_PATH = "/Users/yanzhang/Downloads/backup/chromedriver"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.7049.115"
+
+def build_chrome_options(headless=False):
+    """
+    各 selenium_*.py 原来分别设置的选项合在一起：性能相关设置 + 隐藏自动化特征的 user-agent。
+    """
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
+
+    # --- 增强的浏览器设置 ---
+    # headless 默认的 user-agent 带 HeadlessChrome，必须覆盖
+    chrome_options.add_argument(f'user-agent={USER_AGENT}')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    # --- 性能相关设置 ---
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")  # 禁用图片加载
+    chrome_options.page_load_strategy = 'eager'  # 使用eager策略，DOM准备好就开始
+    return chrome_options
+
+def create_driver(headless=False):
+    service = Service(executable_path=CHROME_DRIVER_PATH)
+    return webdriver.Chrome(service=service, options=build_chrome_options(headless))
+
+class DriverPool:
+    """
+    常驻的 WebDriver 池：最多同时 size 个 Chrome，可以提前 warm_up 全部启动。
+    抓取时用 lease() 借出一个 driver，导航、抓取后归还，下一个站点直接复用同一个会话；
+    每个 driver 使用 max_uses 次后退出并在后台重新启动一个，避免 Chrome 长时间运行后内存不断增长。
+    """
+    def __init__(self, size=3, headless=True, max_uses=20):
+        self.size = size
+        self.headless = headless
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0           # 已占用的名额，包括正在启动的 driver
+        self._drivers = []
+        self._uses = {}
+        self._closed = False
+
+    def _start(self):
+        driver = create_driver(self.headless)
+        with self._lock:
+            if not self._closed:
+                self._drivers.append(driver)
+                self._uses[id(driver)] = 0
+                return driver
+        # 启动期间池已经关闭
+        driver.quit()
+        return None
+
+    def _reserve(self):
+        with self._lock:
+            if self._closed or self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _start_idle(self):
+        """
+        启动一个 driver 放进空闲队列；名额已经由调用方占好，启动失败时释放名额。
+        """
+        try:
+            driver = self._start()
+        except Exception as e:
+            print(f"启动 Chrome 失败: {e}")
+            with self._lock:
+                self._created -= 1
+            return
+        if driver is not None:
+            self._idle.put(driver)
+
+    def warm_up(self):
+        """
+        并行启动所有剩余名额的 Chrome，第一次 lease 时不用再等浏览器启动。
+        """
+        threads = []
+        while self._reserve():
+            thread = threading.Thread(target=self._start_idle, daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+                self._created -= 1
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"关闭 driver 时出错: {e}")
+
+    @staticmethod
+    def _is_alive(driver):
+        try:
+            driver.current_url
+        except Exception:
+            return False
+        return True
+
+    def acquire(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = None
+            if driver is None and self._reserve():
+                try:
+                    driver = self._start()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                if driver is None:
+                    raise RuntimeError("DriverPool 已关闭")
+                return driver
+            if driver is None:
+                if self._closed:
+                    raise RuntimeError("DriverPool 已关闭")
+                # 已经到上限，等别的站点归还；定时醒来检查是否有名额被释放
+                try:
+                    driver = self._idle.get(timeout=1)
+                except queue.Empty:
+                    continue
+            if self._is_alive(driver):
+                return driver
+            # 会话已经失效（Chrome 崩溃等），换一个
+            self._discard(driver)
+
+    def release(self, driver, broken=False):
+        """
+        归还 driver；broken 为 True 时（例如页面崩溃、会话失效）直接退出，名额留给下次 acquire 重新启动。
+        """
+        if broken or self._closed:
+            self._discard(driver)
+            return
+        with self._lock:
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+        if uses >= self.max_uses:
+            # 达到使用次数上限：退出旧实例，保留名额并在后台启动新实例
+            self._discard(driver)
+            if self._reserve():
+                threading.Thread(target=self._start_idle, daemon=True).start()
+            return
+        try:
+            # 离开当前页面，停止页面脚本并释放页面占用的内存
+            driver.get("about:blank")
+        except Exception:
+            self._discard(driver)
+            return
+        self._idle.put(driver)
+
+    @contextmanager
+    def lease(self):
+        """
+        with pool.lease() as driver: 借出一个 driver，结束后自动归还；块内抛出异常时丢弃该 driver。
+        """
+        driver = self.acquire()
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, broken=True)
+            raise
+        self.release(driver)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            drivers, self._drivers = self._drivers, []
+            self._created = 0
+            self._uses.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                print(f"关闭 driver 时出错: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_shared_pool(size=1, headless=False, max_uses=20):
+    """
+    进程内共用的 DriverPool，单独运行某个 selenium_*.py 时使用；进程退出时自动关闭所有 Chrome。
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = DriverPool(size=size, headless=headless, max_uses=max_uses)
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import argparse
+import webbrowser
+from datetime import datetime
+
+from news_table import iter_news_table_rows
+from news_url_index import NEWS_DATE_FORMAT, UrlIndex, url_digest, window_start
+
+BACKUP_SITE_DIR = "/Users/yanzhang/Coding/News/backup/site"
+HISTORY_DB_PATH = os.path.join(BACKUP_SITE_DIR, "news_history.sqlite3")
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    url TEXT,
+    url_key TEXT
+);
+CREATE INDEX IF NOT EXISTS news_site_date ON news (site, date);
+CREATE INDEX IF NOT EXISTS news_site_url_key ON news (site, url_key);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    site TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    rows INTEGER NOT NULL
+);
+"""
+
+def site_html_path(site):
+    return os.path.join(BACKUP_SITE_DIR, f"{site}.html")
+
+def _is_news_date(date_str):
+    try:
+        datetime.strptime(date_str, NEWS_DATE_FORMAT)
+    except ValueError:
+        return False
+    return True
+
+class NewsHistory:
+    """
+    各站点抓取历史的结构化存储（SQLite，只追加）。
+    每次运行只按 (site, date) 索引读出保留窗口内的 url_key，再追加新行，
+    开销与新增行数和窗口大小有关，不再随整个历史增长；backup/site/<site>.html 改为按需生成。
+    """
+    def __init__(self, db_path=HISTORY_DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # WAL 下读不阻塞写，多个抓取脚本同时运行也不会互相卡住
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(HISTORY_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def ensure_imported(self, site, html_path=None):
+        """
+        某个站点第一次使用数据库时，把旧的 backup/site/<site>.html 导入一次，之后不再解析该文件。
+        返回本次导入的行数。
+        """
+        if self.conn.execute("SELECT 1 FROM legacy_imports WHERE site = ?", (site,)).fetchone():
+            return 0
+        html_path = html_path or site_html_path(site)
+        rows = []
+        if os.path.exists(html_path):
+            # 旧文件第一列是日期，表头和日期格式不对的行直接跳过；按文件顺序插入，id 顺序与原来的显示顺序一致。
+            # 没有链接的旧行也导入（url 为空串、不参与去重），重新生成的 HTML 里照旧显示为纯文字标题
+            for row in iter_news_table_rows(html_path, require_link=False):
+                if _is_news_date(row.site):
+                    url_key = url_digest(site, row.url) if row.url else None
+                    rows.append((site, row.site, row.title, row.url, url_key))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO news (site, date, title, url, url_key) VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.execute(
+                "INSERT INTO legacy_imports (site, source, rows) VALUES (?, ?, ?)",
+                (site, html_path, len(rows)))
+        if rows:
+            print(f"已从 {html_path} 导入 {len(rows)} 条 {site} 历史记录")
+        return len(rows)
+
+    def url_index(self, site, since):
+        """
+        读出 since 之后出现过的链接摘要，构建该站点的去重索引。
+        """
+        cursor = self.conn.execute(
+            "SELECT url_key, MAX(date) FROM news"
+            " WHERE site = ? AND date >= ? AND url_key IS NOT NULL GROUP BY url_key",
+            (site, since))
+        return UrlIndex(site, dict(cursor))
+
+    def append(self, site, rows):
+        """
+        追加 [date_str, title, link] 行，一个事务提交。
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO news (site, date, title, url, url_key) VALUES (?, ?, ?, ?, ?)",
+                [(site, date_str, title, link, url_digest(site, link)) for date_str, title, link in rows])
+
+    def iter_rows(self, site, since=None):
+        """
+        按原 HTML 的顺序（新日期在前，同一批次内保持抓取顺序）产出 [date_str, title, link]。
+        """
+        query = "SELECT date, title, url FROM news WHERE site = ?"
+        params = [site]
+        if since is not None:
+            query += " AND date >= ?"
+            params.append(since)
+        query += " ORDER BY date DESC, id"
+        for date_str, title, link in self.conn.execute(query, params):
+            yield [date_str, title, link]
+
+    def render_html(self, site, html_path=None, since=None):
+        """
+        生成和原来格式一致的 backup/site/<site>.html 视图，写临时文件后替换。
+        """
+        html_path = html_path or site_html_path(site)
+        tmp_path = html_path + ".tmp"
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as html_file:
+            html_file.write("<html><body><table border='1'>\n")
+            html_file.write("<tr><th>Date</th><th>Title</th></tr>\n")
+            for date_str, title, link in self.iter_rows(site, since):
+                clickable_title = f"<a href='{link}' target='_blank'>{title}</a>" if link else title
+                html_file.write(f"<tr><td>{date_str}</td><td>{clickable_title}</td></tr>\n")
+                count += 1
+            html_file.write("</table></body></html>")
+            html_file.flush()
+            os.fsync(html_file.fileno())
+        os.replace(tmp_path, html_path)
+        print(f"已生成 {html_path}，共 {count} 条")
+        return html_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从抓取历史数据库生成站点 HTML 视图")
+    parser.add_argument('site', help="站点名，例如 economist、ft、nytimes")
+    parser.add_argument('--days', type=int, default=None, help="只输出最近 N 天的记录")
+    parser.add_argument('--open', action='store_true', help="生成后在浏览器中打开")
+    args = parser.parse_args()
+
+    with NewsHistory() as history:
+        history.ensure_imported(args.site)
+        since = window_start(args.days) if args.days is not None else None
+        path = history.render_html(args.site, since=since)
+    if args.open:
+        webbrowser.open('file://' + os.path.realpath(path), new=2)
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+
+from news_history import NewsHistory
+
+# 旧版 backup/site/<site>.html 的格式：新日期在前，有的行没有链接（标题是纯文字）
+LEGACY_HTML = (
+    "<html><body><table border='1'>\n"
+    "<tr><th>Date</th><th>Title</th></tr>\n"
+    "<tr><td>2025_03_02_08</td><td><a href='https://www.ft.com/content/aaa' target='_blank'>With link A</a></td></tr>\n"
+    "<tr><td>2025_03_02_08</td><td>No link, plain title</td></tr>\n"
+    "<tr><td>2025_03_01_08</td><td><a href='https://www.ft.com/content/bbb' target='_blank'>With link B</a></td></tr>\n"
+    "</table></body></html>"
+)
+
+def check_legacy_round_trip():
+    """
+    导入一个带无链接行的旧 HTML，再从数据库生成 HTML，确认与原文件逐字节一致，且无链接行不参与去重。
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        legacy_path = os.path.join(work_dir, "ft.html")
+        rendered_path = os.path.join(work_dir, "ft_rendered.html")
+        with open(legacy_path, 'w', encoding='utf-8') as f:
+            f.write(LEGACY_HTML)
+
+        with NewsHistory(os.path.join(work_dir, "history.sqlite3")) as history:
+            imported = history.ensure_imported("ft", legacy_path)
+            history.render_html("ft", rendered_path)
+            index = history.url_index("ft", "2025_01_01_00")
+
+        with open(rendered_path, 'r', encoding='utf-8') as f:
+            rendered = f.read()
+        ok = imported == 3 and rendered == LEGACY_HTML and len(index.entries) == 2
+        print(f"导入 {imported} 行，去重索引 {len(index.entries)} 条，生成的 HTML 与原文件"
+              f"{'一致' if rendered == LEGACY_HTML else '不一致'}  {'OK' if ok else 'FAIL'}")
+        return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_legacy_round_trip() else 1)
@@ -0,0 +1,43 @@
+import time
+import threading
+from datetime import datetime
+
+from news_url_index import NEWS_DATE_FORMAT, window_start
+from news_today import append_today_rows
+
+# 历史库和每日总表的合并都在这把锁里做，多个站点并发抓取时结果依次写入
+MERGE_LOCK = threading.Lock()
+
+def scroll_page(driver, times=4, step=800, pause=0.5):
+    """
+    用 JavaScript 滚动页面加载更多内容，不依赖屏幕上的鼠标位置，headless 和并发抓取时也能用。
+    """
+    for _ in range(times):
+        driver.execute_script(f"window.scrollBy(0, {step});")
+        time.sleep(pause)
+
+def merge_site_rows(history, site, label, days, candidates, today_options=None):
+    """
+    把某个站点抓到的 (title, href) 候选按页面顺序去重后写入历史库和每日新闻总表。
+    site 是历史库里的站点名，label 是每日总表第一列显示的名字，days 是去重的保留天数。
+    返回新增的 [date_str, title, link] 行。
+    """
+    with MERGE_LOCK:
+        history.ensure_imported(site)
+        since = window_start(days)
+        url_index = history.url_index(site, since)
+
+        formatted_datetime = datetime.now().strftime(NEWS_DATE_FORMAT)
+        new_rows = []
+        new_rows1 = []
+        for title_text, href in candidates:
+            if not url_index.seen(href, since):
+                new_rows.append([formatted_datetime, title_text, href])
+                new_rows1.append([label, title_text, href])
+                url_index.add(href, formatted_datetime)
+
+        # 新内容追加到历史库；backup/site/<site>.html 需要时用 Modules/news_history.py 生成
+        if new_rows:
+            history.append(site, new_rows)
+        append_today_rows(new_rows1, **(today_options or {}))
+    return new_rows
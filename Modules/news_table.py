@@ -0,0 +1,102 @@
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# TodayCNH_*.html / today_eng.html 表格中的一行：站点、链接、标题
+NewsRow = namedtuple('NewsRow', ['site', 'url', 'title'])
+
+READ_CHUNK_SIZE = 64 * 1024
+
+class NewsTableParser(HTMLParser):
+    """
+    增量解析新闻表格：<tr> 里第一个 <td> 的文字作为站点，第一个 <a> 的 href 和文字作为链接和标题。
+    只有表头 <th>、或缺少站点 / 链接 / 标题的行直接跳过。
+    require_link=False 时没有链接的行也保留：url 为空串，标题取第二个 <td> 的文字。
+    每次 feed 之后从 rows 里取走已经解析完的行，内存只和单个分块相关，不随整个文件增长。
+    """
+    def __init__(self, require_link=True):
+        super().__init__(convert_charrefs=True)
+        self.require_link = require_link
+        self.rows = []
+        self._in_row = False
+        self._cell_index = 0      # 当前行已经进入的 <td> 个数
+        self._in_site_cell = False
+        self._in_title_cell = False
+        self._in_link = False
+        self._site = []
+        self._cell_text = []      # 第二个 <td> 的全部文字，没有链接时作为标题
+        self._url = None
+        self._title = []
+        self._link_done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            # 没写 </tr> 的行在下一个 <tr> 处收尾
+            self._finish_row()
+            self._in_row = True
+            self._cell_index = 0
+            self._site, self._url, self._title, self._cell_text = [], None, [], []
+            self._link_done = False
+        elif not self._in_row:
+            return
+        elif tag == 'td':
+            self._cell_index += 1
+            self._in_site_cell = self._cell_index == 1
+            self._in_title_cell = self._cell_index == 2
+        elif tag == 'a' and not self._link_done and self._url is None:
+            href = dict(attrs).get('href')
+            if href:
+                self._url = href
+                self._in_link = True
+
+    def handle_endtag(self, tag):
+        if not self._in_row:
+            return
+        if tag == 'td':
+            self._in_site_cell = self._in_title_cell = False
+        elif tag == 'a' and self._in_link:
+            self._in_link = False
+            self._link_done = True
+        elif tag in ('tr', 'table'):
+            self._finish_row()
+
+    def handle_data(self, data):
+        if self._in_title_cell:
+            self._cell_text.append(data)
+        if self._in_link:
+            self._title.append(data)
+        elif self._in_site_cell:
+            self._site.append(data)
+
+    def _finish_row(self):
+        if not self._in_row:
+            return
+        self._in_row = False
+        self._in_site_cell = self._in_title_cell = self._in_link = False
+        site = ''.join(self._site).strip()
+        url = (self._url or '').strip()
+        title = ''.join(self._title).strip()
+        if not url and not self.require_link:
+            title = ''.join(self._cell_text).strip()
+        if site and title and (url or not self.require_link):
+            self.rows.append(NewsRow(site, url, title))
+
+    def close(self):
+        super().close()
+        self._finish_row()
+
+def iter_news_table_rows(path, chunk_size=READ_CHUNK_SIZE, require_link=True):
+    """
+    按块读取 HTML 文件，逐行产出 NewsRow，时间和内存都与文件大小呈线性关系。
+    """
+    parser = NewsTableParser(require_link)
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            if parser.rows:
+                yield from parser.rows
+                parser.rows = []
+    parser.close()
+    yield from parser.rows
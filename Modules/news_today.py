@@ -0,0 +1,72 @@
+import os
+import fcntl
+
+TODAY_ENG_PATH = "/Users/yanzhang/Coding/News/today_eng.html"
+TODAY_HEADER = "<html><body><table border='1'>\n<tr><th>site</th><th>Title</th></tr>\n"
+CLOSING_TAG = "</table></body></html>"
+
+# today_wsjcn.html 的格式：带 DOCTYPE 和 meta，结束标签分三行
+WSJCN_TODAY_PATH = "/Users/yanzhang/Coding/News/today_wsjcn.html"
+WSJCN_HEADER = ("<!DOCTYPE html>\n<html>\n<head>\n<meta charset='utf-8'>\n</head>\n<body>\n"
+                "<table border='1'>\n<tr><th>site</th><th>Title</th></tr>\n")
+WSJCN_CLOSING_TAG = "</table>\n</body>\n</html>"
+
+# 只在文件末尾这么大的范围里找结束标签
+TAIL_SCAN_BYTES = 4096
+
+def format_today_row(site, title, link, quote="'"):
+    clickable_title = f"<a href={quote}{link}{quote} target={quote}_blank{quote}>{title}</a>"
+    return f"<tr><td>{site}</td><td>{clickable_title}</td></tr>\n"
+
+def find_closing_offset(f, closing):
+    """
+    返回结束标签在文件中的字节偏移，只读取文件尾部。
+    结束标签后面允许有空白；尾部找不到结束标签时返回文件末尾，新内容直接接在后面。
+    """
+    size = f.seek(0, os.SEEK_END)
+    tail_size = min(size, TAIL_SCAN_BYTES)
+    f.seek(size - tail_size)
+    tail = f.read(tail_size)
+    pos = tail.rfind(closing)
+    if pos < 0 or tail[pos + len(closing):].strip():
+        return size
+    return size - tail_size + pos
+
+def append_today_rows(rows, path=TODAY_ENG_PATH, header=TODAY_HEADER, closing_tag=CLOSING_TAG, quote="'"):
+    """
+    把 [site, title, link] 行追加到每日新闻总表：定位到结束标签处原地写入新行和结束标签，
+    不再读出整个文件再重写，开销只和新增行数有关。
+    写入期间对文件加排他锁，多个抓取脚本同时追加也不会互相覆盖；写完 fsync 并只校验文件尾部。
+    返回追加的行数。
+    """
+    if not rows:
+        return 0
+    payload = ''.join(format_today_row(site, title, link, quote) for site, title, link in rows)
+    closing = closing_tag.encode('utf-8')
+    # 不存在时创建，但不能用 'a+b'：O_APPEND 下 seek 对写入无效，两个脚本同时创建文件时
+    # 后拿到锁的一方会把新行写在对方的结束标签后面
+    f = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+    try:
+        with f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            if f.seek(0, os.SEEK_END) == 0:
+                # 新文件先写入表头
+                f.write(header.encode('utf-8'))
+                offset = f.tell()
+            else:
+                offset = find_closing_offset(f, closing)
+            f.seek(offset)
+            f.write(payload.encode('utf-8'))
+            f.write(closing)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+            # 验证文件完整性：只读回结束标签
+            f.seek(-len(closing), os.SEEK_END)
+            if f.read() != closing:
+                raise IOError("File writing verification failed")
+    except Exception as e:
+        print(f"Error writing to file: {e}")
+        raise
+    return len(rows)
@@ -0,0 +1,106 @@
+import hashlib
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+# backup/site/<site>.html 和 today_eng.html 第一列使用的日期格式，按字符串比较即按时间比较
+NEWS_DATE_FORMAT = '%Y_%m_%d_%H'
+
+def base_url_key(url):
+    """
+    默认规则：与各脚本原来的 is_similar 一致，只比较协议、主机名和路径，忽略查询参数和片段。
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+def exact_url_key(url):
+    # TechReview 原来用 href == old_link 判重，整条 URL 就是 key
+    return url or None
+
+def economist_url_key(url):
+    """
+    Economist 规则：忽略协议，主机名相同且路径的前 5 个组件（部分/年/月/日/标题）相同视为同一篇。
+    路径不足 5 段时回退为整条路径（去掉末尾 '/'）比较。
+    两种形式用不同分隔符，保证短路径不会和长路径的 key 撞上。
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    path = parsed.path.rstrip('/')
+    components = path.split('/')
+    if len(components) < 5:
+        return f"{parsed.netloc}{path}"
+    components = [comp for comp in components if comp]
+    return f"{parsed.netloc}|{'/'.join(components[:5])}"
+
+# 站点 -> canonical key 函数；没有列出的站点使用 base_url_key
+SITE_URL_KEYS = {
+    'economist': economist_url_key,
+    'technologyreview': exact_url_key,
+}
+
+def canonical_url_key(site, url):
+    """
+    返回 url 在该站点下的 canonical key；两个链接 key 相同即原 is_similar 判定为同一篇。
+    """
+    return SITE_URL_KEYS.get(site.lower(), base_url_key)(url)
+
+def url_key_digest(key):
+    # 64 位摘要足够区分几万条链接，存储和比较都比原始 URL 小得多
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+def url_digest(site, url):
+    """
+    url 在该站点下 canonical key 的摘要；没有链接时返回 None。
+    """
+    key = canonical_url_key(site, url)
+    return url_key_digest(key) if key is not None else None
+
+def window_start(days_ago, now=None):
+    """
+    返回 days_ago 天前对应的日期字符串下界。
+    原脚本用 datetime >= cutoff 比较整点日期，cutoff 不是整点时要向上取整到下一个小时才等价。
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=days_ago)
+    if cutoff.minute or cutoff.second or cutoff.microsecond:
+        cutoff = cutoff.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return cutoff.strftime(NEWS_DATE_FORMAT)
+
+class UrlIndex:
+    """
+    站点链接的去重索引：canonical key 摘要 -> 最近一次出现的日期字符串。
+    每个抓到的链接只做一次字典查找，代替对全部历史链接逐个调用 is_similar。
+    """
+    def __init__(self, site, entries=None):
+        self.site = site
+        self.entries = entries or {}
+
+    @classmethod
+    def from_rows(cls, site, rows):
+        """
+        从 [date_str, title, link] 行构建索引，没有链接的行跳过。
+        """
+        index = cls(site)
+        for date_str, _, link in rows:
+            index.add(link, date_str)
+        return index
+
+    def seen(self, url, since=None):
+        """
+        url 是否已经在索引里；给出 since 时只认日期不早于 since 的记录，对应原脚本只读取最近 N 天的旧内容。
+        """
+        digest = url_digest(self.site, url)
+        if digest is None:
+            return False
+        date_str = self.entries.get(digest)
+        if date_str is None:
+            return False
+        return since is None or date_str >= since
+
+    def add(self, url, date_str):
+        digest = url_digest(self.site, url)
+        if digest is None:
+            return
+        if date_str > self.entries.get(digest, ''):
+            self.entries[digest] = date_str
@@ -0,0 +1,70 @@
+import sys
+import time
+import argparse
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append('/Users/yanzhang/Coding/python_code/Modules')
+from driver_pool import DriverPool
+from news_history import NewsHistory
+from news_scrape import merge_site_rows
+
+# 早上依次运行的各个站点脚本；每个模块提供 SITE / LABEL / HISTORY_DAYS 和 scrape(driver)
+SITE_MODULES = [
+    "selenium_FT",
+    "selenium_economist",
+    "selenium_nytimes",
+    "selenium_washingtonpost",
+    "selenium_techreview",
+    "selenium_nikkei_asia",
+    "selenium_wsj_cn",
+]
+
+# 同时运行的 Chrome 数量上限
+MAX_DRIVERS = 3
+# 每个 Chrome 使用多少次后重启
+MAX_USES = 20
+
+def scrape_site(pool, module):
+    """
+    从池里借一个 driver 抓取一个站点，返回 (候选列表, 耗时)。
+    抓取抛异常时认为该 driver 状态不可靠，由池丢弃后重新启动。
+    """
+    start = time.time()
+    try:
+        with pool.lease() as driver:
+            candidates = module.scrape(driver)
+    except Exception as e:
+        print(f"{module.LABEL} 抓取失败: {e}")
+        candidates = []
+    return candidates, time.time() - start
+
+def run_all(module_names=SITE_MODULES, max_drivers=MAX_DRIVERS, headless=True, max_uses=MAX_USES):
+    """
+    并发抓取所有站点，总耗时取决于最慢的站点而不是所有站点之和。
+    结果按 module_names 的顺序依次合并进历史库和每日新闻总表，保证 today_eng.html 中的站点顺序固定。
+    """
+    modules = [importlib.import_module(name) for name in module_names]
+    start = time.time()
+    with DriverPool(size=max_drivers, headless=headless, max_uses=max_uses) as pool, NewsHistory() as history:
+        # 先并行启动全部 Chrome，站点抓取开始时不用再等浏览器启动
+        pool.warm_up()
+        print(f"已启动 {max_drivers} 个 Chrome，用时 {time.time() - start:.1f}s")
+        with ThreadPoolExecutor(max_workers=max_drivers) as executor:
+            futures = [executor.submit(scrape_site, pool, module) for module in modules]
+            for module, future in zip(modules, futures):
+                candidates, elapsed = future.result()
+                new_rows = merge_site_rows(history, module.SITE, module.LABEL, module.HISTORY_DAYS,
+                                           candidates, getattr(module, 'TODAY_OPTIONS', None))
+                print(f"{module.LABEL}: 候选 {len(candidates)} 条，新增 {len(new_rows)} 条，用时 {elapsed:.1f}s")
+    print(f"全部站点完成，总用时 {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并发抓取 Selenium_News 下的所有站点")
+    parser.add_argument('sites', nargs='*', default=SITE_MODULES, help="只运行指定的模块，例如 selenium_FT")
+    parser.add_argument('--drivers', type=int, default=MAX_DRIVERS, help="同时运行的 Chrome 数量")
+    parser.add_argument('--max-uses', type=int, default=MAX_USES, help="每个 Chrome 使用多少次后重启")
+    parser.add_argument('--show', action='store_true', help="显示浏览器窗口（默认 headless）")
+    args = parser.parse_args()
+
+    run_all(args.sites, max_drivers=args.drivers, headless=not args.show, max_uses=args.max_uses)
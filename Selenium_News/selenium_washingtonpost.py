@@ -1,183 +1,51 @@
-import os
-import glob
-import time
-import pyautogui
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from urllib.parse import urlparse
-from datetime import datetime, timedelta
+import sys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 
-def is_similar(url1, url2):
-    """
-    比较两个 URL 的相似度，如果相似度超过阈值则返回 True，否则返回 False。
-    主要比较 URL 的协议、主机名和路径。
-    """
-    parsed_url1 = urlparse(url1)
-    parsed_url2 = urlparse(url2)
-
-    base_url1 = f"{parsed_url1.scheme}://{parsed_url1.netloc}{parsed_url1.path}"
-    base_url2 = f"{parsed_url2.scheme}://{parsed_url2.netloc}{parsed_url2.path}"
-
-    return base_url1 == base_url2
-
-# 获取当前日期
-current_datetime = datetime.now()
-formatted_datetime = current_datetime.strftime("%Y_%m_%d_%H")
-
-# ChromeDriver 路径
-chrome_driver_path = "/Users/yanzhang/Downloads/backup/chromedriver"
+sys.path.append('/Users/yanzhang/Coding/python_code/Modules')
+from driver_pool import get_shared_pool
+from news_history import NewsHistory
+from news_scrape import merge_site_rows, scroll_page
 
-# 设置 ChromeDriver
-chrome_options = Options()
-service = Service(executable_path=chrome_driver_path)
-driver = webdriver.Chrome(service=service, options=chrome_options)
+SITE = "washingtonpost"     # 历史库中的站点名
+LABEL = "WashingtonPost"    # today_eng.html 第一列
+HISTORY_DAYS = 10           # 去重保留天数
+HOME_URL = "https://www.washingtonpost.com/"
 
-user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.7049.115" # 你可以更新为一个最新的Chrome User-Agent
-chrome_options.add_argument(f'user-agent={user_agent}')
-chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-chrome_options.add_experimental_option('useAutomationExtension', False)
-
-# --- 性能相关设置 ---
-chrome_options.add_argument("--disable-extensions")
-chrome_options.add_argument("--disable-gpu")
-chrome_options.add_argument("--disable-dev-shm-usage")
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--blink-settings=imagesEnabled=false")  # 禁用图片加载
-
-# 打开 WashingtonPost 网站
-driver.get("https://www.washingtonpost.com/")
-
-# 查找旧的 html 文件
-file_pattern = "/Users/yanzhang/Coding/News/backup/site/washingtonpost.html"
-old_file_list = glob.glob(file_pattern)
-
-old_content = []
-if old_file_list:
-    old_file_path = old_file_list[0]
-    seven_days_ago = current_datetime - timedelta(days=10)
-
-    try:
-        with open(old_file_path, 'r', encoding='utf-8') as file:
-            soup = BeautifulSoup(file, 'html.parser')
-            rows = soup.find_all('tr')[1:]  # 跳过标题行
-            for row in rows:
-                cols = row.find_all('td')
-                if len(cols) >= 2:  # 确保行有足够的列
-                    date_str = cols[0].text.strip()
-                    # 解析日期字符串
-                    date = datetime.strptime(date_str, '%Y_%m_%d_%H')
-                    # 若日期大于等于50天前的日期，则保留
-                    if date >= seven_days_ago:
-                        title_column = cols[1]
-                        title = title_column.text.strip()
-                        # 从标题所在的列中提取链接
-                        link = title_column.find('a')['href'] if title_column.find('a') else None
-                        old_content.append([date_str, title, link])
-    except OSError as e:
-        print(f"读取文件时出错: {e}")
-
-# 抓取新内容
-new_rows = []
-new_rows1 = []
-all_links = [old_link for _, _, old_link in old_content]  # 既有的所有链接
-
-for _ in range(4):
-    pyautogui.scroll(-80)
-    time.sleep(0.2)
-
-try:
-    css_selector = "a[href*='/2025/']:not(.label-link)"
-    titles_elements = driver.find_elements(By.CSS_SELECTOR, css_selector)
-
-    for title_element in titles_elements:
-        href = title_element.get_attribute('href')
-        title_text = title_element.text.strip()
-
-        if href and title_text:
-            #print(f"标题: {title_text}, 链接: {href}")
-
-            if ('podcasts' not in href and "sports" not in href and "/music/" not in href and "weather" not in href and "/books/" not in href and "food" not in href):
-                if not any(is_similar(href, old_link) for _, _, old_link in old_content):
-                    if not any(is_similar(href, new_link) for _, _, new_link in new_rows):
-                        new_rows.append([formatted_datetime, title_text, href])
-                        new_rows1.append(["WashingtonPost", title_text, href])
-                        all_links.append(href)  # 添加到所有链接的列表中
-
-except Exception as e:
-    print("抓取过程中出现错误:", e)
+def scrape(driver):
+    """
+    打开 WashingtonPost 首页，按页面顺序返回 (title, href) 候选；去重和写入由 merge_site_rows 完成。
+    """
+    driver.get(HOME_URL)
 
-# 关闭驱动
-driver.quit()
+    # 用 JavaScript 滚动代替 pyautogui，headless 下同样有效
+    scroll_page(driver, pause=0.2)
 
-if old_file_list:
+    candidates = []
     try:
-        os.remove(old_file_path)
-        print(f"文件 {old_file_path} 已被删除。")
-    except OSError as e:
-        print(f"错误: {e.strerror}. 文件 {old_file_path} 无法删除。")
-
-# 创建 HTML 文件
-new_html_path = f"/Users/yanzhang/Coding/News/backup/site/washingtonpost.html"
-with open(new_html_path, 'w', encoding='utf-8') as html_file:
-    # 写入 HTML 基础结构和表格开始标签
-    html_file.write("<html><body><table border='1'>\n")
-
-    # 写入标题行
-    html_file.write("<tr><th>Date</th><th>Title</th></tr>\n")
+        css_selector = "a[href*='/2025/']:not(.label-link)"
+        titles_elements = driver.find_elements(By.CSS_SELECTOR, css_selector)
 
-    # 写入新抓取的内容
-    new_content_added = False
-    for row in new_rows:
-        clickable_title = f"<a href='{row[2]}' target='_blank'>{row[1]}</a>"
-        html_file.write(f"<tr><td>{row[0]}</td><td>{clickable_title}</td></tr>\n")
-        new_content_added = True
+        for title_element in titles_elements:
+            href = title_element.get_attribute('href')
+            title_text = title_element.text.strip()
 
-    # 写入旧内容
-    for row in old_content:
-        clickable_title = f"<a href='{row[2]}' target='_blank'>{row[1]}</a>" if row[2] else row[1]
-        html_file.write(f"<tr><td>{row[0]}</td><td>{clickable_title}</td></tr>\n")
+            if href and title_text:
+                #print(f"标题: {title_text}, 链接: {href}")
 
-    # 结束表格和 HTML 结构
-    html_file.write("</table></body></html>")
+                if ('podcasts' not in href and "sports" not in href and "/music/" not in href and "weather" not in href and "/books/" not in href and "food" not in href):
+                    candidates.append((title_text, href))
 
-if new_rows1:
-    # 创建用于翻译的每日新闻总表html
-    today_html_path = "/Users/yanzhang/Coding/News/today_eng.html"
-    file_exists = os.path.isfile(today_html_path)
+    except Exception as e:
+        print("抓取过程中出现错误:", e)
+    return candidates
 
-    # 准备要追加的内容
-    append_content = ""
-    for row in new_rows1:
-        clickable_title = f"<a href='{row[2]}' target='_blank'>{row[1]}</a>"
-        append_content += f"<tr><td>{row[0]}</td><td>{clickable_title}</td></tr>\n"
+def main():
+    # 从 driver 池借出 Chrome，抓完归还；进程退出时池负责关闭
+    with get_shared_pool().lease() as driver:
+        candidates = scrape(driver)
 
-    # 如果文件已存在，先删除末尾的HTML结束标签，再追加新内容，最后重新添加结束标签
-    closing_tag = "</table></body></html>"
-    if file_exists:
-        # 读取整个文件内容，并去掉原有的结束标签
-        with open(today_html_path, 'r', encoding='utf-8') as html_file:
-            content = html_file.read()
-        
-        # 如果存在结束标签，则将其移除
-        if closing_tag in content:
-            content = content.replace(closing_tag, "")
-        
-        # 拼接新内容和完整的结束标签
-        new_content = content + append_content + closing_tag
+    with NewsHistory() as history:
+        merge_site_rows(history, SITE, LABEL, HISTORY_DAYS, candidates)
 
-        # 以写入模式完整覆盖原文件，确保不会残留任何多余数据
-        with open(today_html_path, 'w', encoding='utf-8') as html_file:
-            html_file.write(new_content)
-    else:
-        # 如果文件是新建的，添加新内容和HTML结束标签
-        with open(today_html_path, 'w', encoding='utf-8') as html_file:
-            html_file.write("<html><body><table border='1'>\n")
-            html_file.write("<tr><th>site</th><th>Title</th></tr>\n")
-            html_file.write(append_content)
-            html_file.write(closing_tag)
-            html_file.flush()
-            os.fsync(html_file.fileno())
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
 import re
 import os
+import sys
+import ctypes
+import ctypes.util
+import bisect
 import hashlib
 import glob
 import shutil
 import json
+import traceback
+import tempfile
+import functools
+import contextlib
+import cProfile
+import resource
+import zipfile
+import html
+import mimetypes
+from collections import namedtuple
 from urllib.parse import urlsplit, urlunsplit
 
 # ------  整个pdf逻辑部分开始  ------#
@@ -16,103 +30,351 @@ from reportlab.lib import colors
 from PIL import Image
 import math
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+sys.path.append('/Users/yanzhang/Coding/python_code/Modules')
+from news_table import iter_news_table_rows
+
+# ------  站点表：PDF 标题、JSON 分组、主要站点判断共用  ------#
+# code: 站点代码（PDF 中的站点标题行，TodayCNH 中的站点名）；display: JSON 分组用的中文名，
+# None 表示沿用原站点代码；domains: 归属该站点的域名后缀；aliases: TodayCNH 里可能出现的其他写法；
+# major: PDF 中以该代码开头的行按站点标题绘制。新增媒体只需在这里加一行。
+Site = namedtuple('Site', ['code', 'display', 'domains', 'aliases', 'major'])
+
+SITE_TABLE = (
+    Site('FT',               '伦敦金融时报',     ('ft.com',),               (),              True),
+    Site('WSJ',              '华尔街日报',       ('wsj.com',),              (),              True),
+    Site('WSJCN',            '华尔街日报中文网', (),                        (),              True),
+    Site('BLOOMBERG',        '布隆伯格金融',     ('bloomberg.com',),        (),              True),
+    Site('REUTERS',          '路透社',           ('reuters.com',),          (),              True),
+    Site('NYTIMES',          '纽约时报',         ('nytimes.com',),          (),              True),
+    Site('WASHINGTONPOST',   '华盛顿邮报',       ('washingtonpost.com',),   (),              True),
+    Site('ECONOMIST',        '经济学人',         ('economist.com',),        (),              True),
+    Site('TECHNOLOGYREVIEW', '麻省理工技术评论', ('technologyreview.com',), ('techreview',), True),
+    Site('NIKKEIASIA',       '日经新闻亚洲版',   (),                        (),              False),
+    Site('OTHER',            None,               (),                        (),              True),
+)
+
+# 域名后缀 -> Site；按主机名的标签从长到短查，O(标签数)
+SITE_BY_DOMAIN = {domain: site for site in SITE_TABLE for domain in site.domains}
+# 站点显示名称映射（不区分大小写，键为小写代码或别名）
+SITE_DISPLAY_MAP = {
+    key.lower(): site.display
+    for site in SITE_TABLE if site.display
+    for key in (site.code,) + site.aliases
+}
+MAJOR_SITES = frozenset(site.code for site in SITE_TABLE if site.major)
+# str.startswith 可以直接接受元组，一次调用判断所有主要站点
+MAJOR_SITE_PREFIXES = tuple(sorted(MAJOR_SITES))
+_URL_SCHEME_RE = re.compile(r'^https?://(www\.)?')
 
-MAJOR_SITES = {s.upper() for s in (
-    'FT','WSJ','BLOOMBERG','REUTERS','NYTIMES',
-    'WASHINGTONPOST','ECONOMIST','TECHNOLOGYREVIEW', 'WSJCN', 'OTHER'
-)}
-
-def get_pdf_path(txt_path):
+@functools.lru_cache(maxsize=4096)
+def resolve_site(url):
+    """
+    URL -> (站点代码, 显示名称)。先按域名后缀查站点表，查不到时用主域名（倒数第二段）的大写作代码。
+    同一 URL 在 PDF 和 JSON 阶段会被反复解析，结果用 LRU 缓存。
+    """
+    domain = _URL_SCHEME_RE.sub('', url.lower()).split('/')[0]
+    labels = domain.split('.')
+    for i in range(len(labels) - 1):
+        site = SITE_BY_DOMAIN.get('.'.join(labels[i:]))
+        if site is not None:
+            return site.code, site.display or site.code
+    code = (labels[-2] if len(labels) >= 2 else labels[0]).upper()
+    return code, SITE_DISPLAY_MAP.get(code.lower(), code)
+
+def site_display_name(site_code):
+    # TodayCNH 中的站点代码 -> 显示名称，默认回退到原代码
+    return SITE_DISPLAY_MAP.get(site_code.lower(), site_code)
+
+# ------  文章解析：PDF 和 JSON 共用  ------#
+URL_PATTERN = re.compile(r'(https?://[^\s]+)')
+
+class Article(namedtuple('Article', ['url', 'norm_url', 'lines', 'site'])):
+    """
+    News_*.txt 中的一篇文章。
+    url 为 None 表示第一个 URL 之前的前导文字；lines 保留原始行（含 URL 行），
+    PDF 排版需要原样还原，JSON 只取 body。
+    """
+    __slots__ = ()
+
+    @property
+    def text(self):
+        return '\n'.join(self.lines)
+
+    @property
+    def body(self):
+        # 去掉 URL 行、空行和 BOM 后的正文
+        body_lines = (line.strip().lstrip('\ufeff') for line in self.lines[1:])
+        return '\n'.join(line for line in body_lines if line).strip()
+
+def _make_article(lines):
+    first = lines[0].strip().lstrip('\ufeff')
+    url_match = URL_PATTERN.search(first) if first.startswith('http') else None
+    if not url_match:
+        return Article(None, None, lines, None)
+    url = url_match.group(1)
+    return Article(url, normalize_url(url), lines, extract_site_name(url))
+
+def iter_articles(fh):
+    """
+    单次遍历文件句柄（或任意行迭代器），按 "以 http 开头的行" 切分文章，逐篇 yield Article。
+    和原来的 content.strip().split('\n') 一致：忽略首尾空白，中间的空行原样保留在 lines 里。
+    """
+    current = []
+    pending_blank = []
+    for line in fh:
+        if line.endswith('\n'):
+            line = line[:-1]
+        if not line.strip():
+            # 空白行先挂起，文件末尾的空白行最终会被丢掉
+            if current:
+                pending_blank.append(line)
+            continue
+        current.extend(pending_blank)
+        pending_blank = []
+        if not current:
+            line = line.lstrip()
+        elif line.strip().lstrip('\ufeff').startswith('http'):
+            yield _make_article(current)
+            current = []
+        current.append(line)
+    if current:
+        current[-1] = current[-1].rstrip()
+        yield _make_article(current)
+
+# 每个 txt 每次运行只读取、切分一次，PDF 和 JSON 阶段共用结果
+_ARTICLE_CACHE = {}
+
+def load_articles(txt_path):
+    st = os.stat(txt_path)
+    key = (st.st_size, st.st_mtime_ns)
+    cached = _ARTICLE_CACHE.get(txt_path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        articles = list(iter_articles(f))
+    _ARTICLE_CACHE[txt_path] = (key, articles)
+    return articles
+
+def get_output_path(txt_path, fmt):
     directory = os.path.dirname(txt_path)
     filename = os.path.basename(txt_path)
-    pdf_filename = os.path.splitext(filename)[0] + '.pdf'
-    return os.path.join(directory, pdf_filename)
+    out_filename = os.path.splitext(filename)[0] + '.' + fmt
+    return os.path.join(directory, out_filename)
+
+def get_pdf_path(txt_path):
+    return get_output_path(txt_path, 'pdf')
+
+# ------  PDF 分卷  ------#
+# 单卷上限：页数、嵌入图片字节数、渲染秒数，0 表示不限。全为 0 时只输出一个 News_X.pdf。
+# 秒数上限会让分卷位置随机器负载变化，需要可复现输出时只用页数和字节数。
+PdfPartBudget = namedtuple('PdfPartBudget', ['max_pages', 'max_bytes', 'max_seconds'])
+NO_PART_BUDGET = PdfPartBudget(0, 0, 0)
+PDF_PART_SUFFIX = "_part"
+
+def get_pdf_part_path(pdf_path, index):
+    base, ext = os.path.splitext(pdf_path)
+    return f"{base}{PDF_PART_SUFFIX}{index}{ext}"
+
+def list_render_outputs(out_path):
+    """
+    一个 txt 某种格式现有的输出：未分卷时是 News_X.pdf / News_X.epub，
+    PDF 分卷时是按卷号排序的 News_X_partN.pdf。
+    """
+    base, ext = os.path.splitext(out_path)
+    part_re = re.compile(re.escape(os.path.basename(base) + PDF_PART_SUFFIX) + r'(\d+)' + re.escape(ext) + '$')
+    parts = []
+    for path in glob.glob(glob.escape(base + PDF_PART_SUFFIX) + '*' + ext):
+        m = part_re.match(os.path.basename(path))
+        if m:
+            parts.append((int(m.group(1)), path))
+    outputs = [out_path] if os.path.exists(out_path) else []
+    return outputs + [path for _, path in sorted(parts)]
+
+# 增量构建清单：记录每个 PDF 生成时所有真实输入的内容哈希
+BUILD_MANIFEST_NAME = ".pdf_build_manifest.json"
+# 渲染逻辑有改动时递增，让旧清单全部失效
+PDF_RENDER_VERSION = 3
+EPUB_RENDER_VERSION = 1
+RENDER_VERSIONS = {"pdf": PDF_RENDER_VERSION, "epub": EPUB_RENDER_VERSION}
+# 只有这些格式失败才算 TXT 转换阶段失败；EPUB 等附加格式失败只记录警告，不阻塞 PDF 和后面的阶段
+REQUIRED_FORMATS = frozenset({"pdf"})
+
+def load_build_manifest(directory):
+    manifest_path = os.path.join(directory, BUILD_MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def save_build_manifest(directory, manifest):
+    manifest_path = os.path.join(directory, BUILD_MANIFEST_NAME)
+    with atomic_write(manifest_path) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+
+def compute_source_fingerprint(articles, url_images, image_dir, digest_cache):
+    """
+    一个 News_*.txt 所有真实输入的摘要：
+    txt 内容 + 匹配到的 article_copier 条目 + 这些图片文件的内容摘要。
+    图片摘要取自按 (size, mtime_ns, inode) 判断变化的 digest_cache（Md5Cache，由 image_digest_cache 取得），
+    没变的图片不再重新读取；各输出格式在此基础上加上自己的版本号等参数。
+    digest_cache 必须由调用方给出，缓存文件放在输出目录的 .image_cache 里，不能落进会被备份的图片目录。
+    """
+    txt_hash = hashlib.sha256()
+    copier_entries = []
+    image_hashes = {}
+    for article in articles:
+        txt_hash.update(article.text.encode('utf-8') + b'\n')
+        if not article.url:
+            continue
+        matched = match_article_images(article.url, url_images)
+        if not matched:
+            continue
+        article_url, images = matched
+        copier_entries.append([article_url, images])
+        for img_name in images:
+            if img_name in image_hashes:
+                continue
+            img_path = os.path.join(image_dir, img_name)
+            image_hashes[img_name] = digest_cache.get_or_compute(img_path) if os.path.isfile(img_path) else None
 
-def needs_conversion(txt_path, pdf_path):
-    if not os.path.exists(pdf_path):
+    return {
+        "txt": txt_hash.hexdigest(),
+        "copier": copier_entries,
+        "images": image_hashes,
+    }
+
+def compute_output_fingerprint(source, fmt, part_budget=None):
+    """
+    某个输出格式的指纹：输入摘要 + 渲染版本（PDF 启用分卷时再加上分卷上限）。
+    任何一项真正变化时指纹才会变化，单纯 touch 文件不会触发重建。
+    """
+    payload = dict(source, version=RENDER_VERSIONS[fmt])
+    if fmt != "pdf":
+        payload["format"] = fmt
+    elif part_budget and any(part_budget):
+        payload["parts"] = list(part_budget)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+def compute_pdf_fingerprint(articles, url_images, image_dir, digest_cache, part_budget=None):
+    return compute_output_fingerprint(compute_source_fingerprint(articles, url_images, image_dir, digest_cache),
+                                      "pdf", part_budget)
+
+def needs_conversion(txt_path, pdf_path, fingerprint=None, manifest=None):
+    outputs = list_render_outputs(pdf_path)
+    if not outputs:
         return True
+    if fingerprint is not None and manifest is not None:
+        # 有构建清单时比较内容指纹，并确认记录的各分卷都还在
+        entry = manifest.get(os.path.basename(pdf_path), {})
+        if entry.get("fingerprint") != fingerprint:
+            return True
+        recorded = entry.get("parts", [os.path.basename(pdf_path)])
+        return recorded != [os.path.basename(path) for path in outputs]
     txt_mtime = os.path.getmtime(txt_path)
-    pdf_mtime = os.path.getmtime(pdf_path)
+    pdf_mtime = min(os.path.getmtime(path) for path in outputs)
     return txt_mtime > pdf_mtime
 
-def find_images_for_content(content, url_images):
+class UrlImageIndex:
+    """
+    由 parse_article_copier 的结果一次性建立的 URL -> 图片索引。
+    先按 normalize_url 精确查找（O(1)），找不到时再做前缀回退：
+      - copier 里的 URL 是文章 URL 的上级路径：逐级截断文章路径查字典，O(路径层数)
+      - 文章 URL 是 copier 里某个 URL 的上级路径：在排序后的键上二分，O(log n)
+    前缀只在 '/' 边界上成立，避免 /a 误匹配 /ab。
+    """
+    def __init__(self, url_images):
+        self.url_images = url_images
+        self._by_norm = {}
+        for article_url, images in url_images.items():
+            # 归一化后重复的 URL 保留先出现的那条，和原来按顺序遍历的结果一致
+            self._by_norm.setdefault(normalize_url(article_url), (article_url, images))
+        self._sorted_keys = sorted(self._by_norm)
+
+    def __len__(self):
+        return len(self._by_norm)
+
+    def lookup(self, url):
+        nu = normalize_url(url)
+        hit = self._by_norm.get(nu)
+        if hit:
+            return hit
+
+        # copier URL 是文章 URL 的前缀：从长到短截断路径
+        prefix = nu
+        while '/' in prefix:
+            prefix = prefix.rsplit('/', 1)[0]
+            if prefix.endswith(':/') or prefix.endswith(':'):
+                break
+            hit = self._by_norm.get(prefix)
+            if hit:
+                return hit
+
+        # 文章 URL 是 copier URL 的前缀：二分定位 nu + '/' 开头的第一个键
+        lo = nu + '/'
+        i = bisect.bisect_left(self._sorted_keys, lo)
+        if i < len(self._sorted_keys) and self._sorted_keys[i].startswith(lo):
+            return self._by_norm[self._sorted_keys[i]]
+        return None
+
+def match_article_images(url, url_images):
+    """
+    在 article_copier 的映射里查找与 url 对应的条目，返回 (article_url, images) 或 None。
+    url_images 可以是原始字典，也可以是预先建好的 UrlImageIndex（批量查找时应传索引）。
+    """
+    if not isinstance(url_images, UrlImageIndex):
+        url_images = UrlImageIndex(url_images)
+    return url_images.lookup(url)
+
+def find_images_for_content(articles, url_images):
     article_images = []
-    articles = []
-    current_article = []
-    lines = content.strip().split('\n')
-    
-    for line in lines:
-        if line.startswith('http'):
-            if current_article:
-                articles.append('\n'.join(current_article))
-                current_article = []
-        current_article.append(line)
-    
-    if current_article:
-        articles.append('\n'.join(current_article))
+    index = url_images if isinstance(url_images, UrlImageIndex) else UrlImageIndex(url_images)
     
     print("\n找到的文章和URL:")
     for article in articles:
-        url_match = re.search(r'(https?://[^\s]+)', article)
-        if url_match:
-            url = url_match.group(1)
-            print(f"\nArticle URL: {url}")
+        if article.url:
+            print(f"\nArticle URL: {article.url}")
             
-            for article_url, images in url_images.items():
-                # 使用更宽松的匹配，检查 URL 是否相互包含
-                if url in article_url or article_url in url:
-                    print(f"Matched with: {article_url}")
-                    print(f"Images found: {images}")
-                    article_images.append((article, images))
-                    break # 找到匹配后即可停止内层循环
+            matched = index.lookup(article.url)
+            if matched:
+                article_url, images = matched
+                print(f"Matched with: {article_url}")
+                print(f"Images found: {images}")
+                article_images.append((article, images))
 
     return article_images
 
-def distribute_images_in_content(content, url_images):
+def distribute_images_in_content(articles, url_images):
     if not url_images:
-        return content
+        return '\n'.join(article.text for article in articles)
     
-    article_images = find_images_for_content(content, url_images)
+    article_images = find_images_for_content(articles, url_images)
+    # 按文章 URL 建表，后面每篇文章 O(1) 取图片；同一 URL 出现多次时保留第一条
+    images_by_url = {}
+    for art, imgs in article_images:
+        images_by_url.setdefault(art.url, (art, imgs))
     
     print("\n开始分布图片:")
     print(f"找到 {len(article_images)} 篇文章需要处理")
     
-    # 找出所有文章块，包括没有图片的文章
-    all_articles = []
-    current_article = []
-    lines = content.strip().split('\n')
-    
-    for line in lines:
-        if line.startswith('http') and current_article:
-            all_articles.append('\n'.join(current_article))
-            current_article = []
-        current_article.append(line)
-    
-    if current_article:
-        all_articles.append('\n'.join(current_article))
-    
-    # 处理所有文章，添加网站名称
+    # 处理所有文章（包括没有图片的文章），添加网站名称
     processed_content = []
-    for article in all_articles:
+    for parsed in articles:
+        article = parsed.text
         lines = article.strip().split('\n')
-        # 用正则提取文章中第一个出现的 URL
-        url_match = re.search(r'(https?://[^\s]+)', article)
-        url_line = url_match.group(1) if url_match else ''
+        url_line = parsed.url
         if not url_line:
             processed_content.append(article)
             continue
             
-        # 提取网站名称
-        site_name = extract_site_name(url_line)
+        # 网站名称在解析时已经算好
+        site_name = parsed.site
         
         # 查找这篇文章是否有图片
-        article_with_images = None
-        for art, imgs in article_images:
-            art_url_match = re.search(r'(https?://[^\s]+)', art)
-            art_url = art_url_match.group(1) if art_url_match else ''
-            if art_url == url_line:
-                article_with_images = (art, imgs)
-                break
+        article_with_images = images_by_url.get(url_line)
                 
         # 先添加网站名称，然后再添加文章内容
         processed_content.append(f"{site_name}\n")
@@ -174,15 +436,142 @@ def distribute_images_in_content(content, url_images):
     # 合并所有处理后的内容
     return '\n'.join(processed_content)
 
-def clean_and_format_text(txt_path, article_copier_path, image_dir):
+# ------  图片预处理缓存  ------#
+# 嵌入 PDF 的图片最大像素宽度：A4 宽 595pt，按 2 倍取整，手机上放大看也足够清晰
+PDF_IMAGE_MAX_PX = 1200
+JPEG_QUALITY = 85
+# 缩放/编码参数改动时递增，旧的派生图自动失效
+IMAGE_CACHE_VERSION = 1
+IMAGE_CACHE_DIR_NAME = ".image_cache"
+# 派生图缓存的总大小上限，超出时按修改时间从旧到新删除
+IMAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# 源图片的内容摘要缓存，放在派生图缓存目录里，和派生图一起随 .image_cache 删除
+IMAGE_DIGEST_CACHE_NAME = "image_digests.json"
+
+# 进程内记住 (路径, 大小, mtime) -> 派生图路径，同一进程里不用重复计算哈希
+_DERIVATIVE_MEMO = {}
+# (图片目录, 缓存目录) -> Md5Cache，指纹计算和派生图共用同一份
+_IMAGE_DIGEST_CACHES = {}
+
+def image_digest_cache(image_dir, cache_dir):
+    """
+    返回 image_dir 中图片的 Md5Cache（按 size / mtime_ns / inode 判断变化），每个进程每个目录只加载一次。
+    主进程计算指纹时填充并保存，进程池里的子进程加载保存后的文件，只读不写。
+    """
+    key = (os.path.abspath(image_dir), os.path.abspath(cache_dir))
+    cache = _IMAGE_DIGEST_CACHES.get(key)
+    if cache is None:
+        cache = _IMAGE_DIGEST_CACHES[key] = Md5Cache(key[0], os.path.join(key[1], IMAGE_DIGEST_CACHE_NAME))
+    return cache
+
+def _image_has_alpha(img):
+    return img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+
+def get_image_derivative(img_path, cache_dir, max_px=PDF_IMAGE_MAX_PX):
+    """
+    返回 img_path 对应的预缩放派生图路径（内容寻址：源文件 MD5 + 目标宽度）。
+    宽度超过 max_px 或格式不是 JPEG/PNG（webp、avif、gif 等）的图片会被缩放并重新编码，
+    有透明通道的存成 PNG，其余存成 JPEG。同一张图被多个 PDF 引用时只处理一次。
+    出错时返回原图路径，保证渲染不受影响。
+    """
+    st = os.stat(img_path)
+    memo_key = (img_path, st.st_size, st.st_mtime_ns, max_px)
+    cached_path = _DERIVATIVE_MEMO.get(memo_key)
+    if cached_path and os.path.exists(cached_path):
+        return cached_path
+
+    # 源文件摘要走 stat 缓存，计算指纹时已经算过的图片这里不再读取
+    digest = image_digest_cache(os.path.dirname(img_path), cache_dir).get_or_compute(img_path)
     try:
-        with open(txt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        for ext in ('.jpg', '.png'):
+            cached_path = os.path.join(cache_dir, digest[:2], f"{digest}_{max_px}_v{IMAGE_CACHE_VERSION}{ext}")
+            if os.path.exists(cached_path):
+                # 更新修改时间，prune_image_cache 超出大小上限时先删最久没用过的
+                os.utime(cached_path)
+                _DERIVATIVE_MEMO[memo_key] = cached_path
+                return cached_path
+
+        with Image.open(img_path) as img:
+            img.load()
+            has_alpha = _image_has_alpha(img)
+            ext = '.png' if has_alpha else '.jpg'
+            cached_path = os.path.join(cache_dir, digest[:2], f"{digest}_{max_px}_v{IMAGE_CACHE_VERSION}{ext}")
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            # 写临时文件再原子改名，多个进程同时处理同一张图也不会读到半截文件
+            tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+
+            if img.format in ('JPEG', 'PNG') and img.width <= max_px:
+                # 已经是小尺寸的 JPEG/PNG，直接复用原始字节，避免二次压缩损失画质
+                shutil.copyfile(img_path, tmp_path)
+            else:
+                if img.width > max_px:
+                    new_height = max(1, round(img.height * max_px / img.width))
+                    img = img.resize((max_px, new_height), Image.LANCZOS)
+                if has_alpha:
+                    img.convert('RGBA').save(tmp_path, 'PNG', optimize=True)
+                else:
+                    img.convert('RGB').save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            os.replace(tmp_path, cached_path)
+    except Exception as e:
+        print(f"生成图片缓存失败，使用原图: {img_path} ({str(e)})")
+        return img_path
+
+    _DERIVATIVE_MEMO[memo_key] = cached_path
+    return cached_path
+
+def prune_image_cache(cache_dir, live_digests, max_bytes=IMAGE_CACHE_MAX_BYTES):
+    """
+    清理派生图缓存，返回 (删除个数, 释放字节数)：
+    源图片已经不在图片目录里（摘要不在 live_digests 中）、版本号过期的派生图，以及残留的临时文件直接删除；
+    剩下的总大小超过 max_bytes 时，再按修改时间从旧到新删除，直到回到上限以内。
+    """
+    suffix = f"_v{IMAGE_CACHE_VERSION}"
+    removed = freed = 0
+    kept = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if root == cache_dir:
+                continue  # 顶层是摘要缓存等元数据，不是派生图
+            stem = os.path.splitext(name)[0]
+            digest = stem.split('_', 1)[0]
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith('.tmp') or not stem.endswith(suffix) or digest not in live_digests:
+                os.remove(path)
+                removed += 1
+                freed += st.st_size
+            else:
+                kept.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in kept)
+    if max_bytes and total > max_bytes:
+        for _, size, path in sorted(kept):
+            if total <= max_bytes:
+                break
+            os.remove(path)
+            removed += 1
+            freed += size
+            total -= size
+    # 删掉清空了的两位前缀子目录
+    for root, dirs, files in os.walk(cache_dir, topdown=False):
+        if root != cache_dir and not dirs and not files:
+            os.rmdir(root)
+    _DERIVATIVE_MEMO.clear()
+    return removed, freed
+
+def clean_and_format_text(txt_path, article_copier_path, image_dir, articles=None):
+    try:
+        if articles is None:
+            articles = load_articles(txt_path)
             
         print(f"\n处理文件: {txt_path}")
         
         url_images = parse_article_copier(article_copier_path)
-        cleaned_content = distribute_images_in_content(content, url_images)
+        cleaned_content = distribute_images_in_content(articles, url_images)
 
         # 使用集合来存储唯一的图片路径，避免重复
         unique_image_paths = set()
@@ -238,246 +627,541 @@ def clean_and_format_text(txt_path, article_copier_path, image_dir):
         print(f"处理文本时出现错误: {str(e)}")
         return None, []
 
-def txt_to_pdf_with_formatting(txt_path, pdf_path, article_copier_path, image_dir):
-    try:
-        content, images = clean_and_format_text(txt_path, article_copier_path, image_dir)
-        if not content:
-            return False
-            
-        print(f"\n开始创建PDF: {pdf_path}")
-        print(f"图片数量: {len(images)}")
-        
-        # 创建PDF文档
-        c = canvas.Canvas(pdf_path, pagesize=A4)
-        width, height = A4
-        
-        def draw_black_background():
-            # 绘制黑色背景
-            c.setFillColor(colors.black)
-            c.rect(0, 0, width, height, fill=1)
-            # 重置填充颜色为白色用于文本
-            # c.setFillColor(colors.white)
-            c.setFillColor(colors.HexColor('#D3D3D3'))  # 米色 浅灰色: '#E0E0E0' 暖灰色: '#D3D3D3' 象牙色: '#FFFFF0'
-        
+def iter_content_blocks(content):
+    """
+    把 clean_and_format_text 的结果拆成渲染块，各输出后端共用：
+    ('image', 图片文件名) / ('site', 站点标题) / ('text', 段落文字，可能为空串)。
+    """
+    for paragraph in content.splitlines():
+        if '--IMAGE_PLACEHOLDER_' in paragraph:
+            yield 'image', paragraph.replace('--IMAGE_PLACEHOLDER_', '').replace('--', '').strip()
+            continue
+        # 处理文本段落：去掉 BOM、常见中英文标点
+        text = paragraph.strip().lstrip('\ufeff').lstrip("：:。.，,")
+        # 检查是否是主要新闻网站名称
+        if text.upper().startswith(MAJOR_SITE_PREFIXES):
+            yield 'site', text
+        else:
+            yield 'text', text
+
+class NewsRenderer:
+    """
+    News_*.txt 输出后端的接口。所有后端接收同一份 clean_and_format_text 结果（一次解析、一次清洗），
+    图片都经 get_image_derivative 取缩放后的派生图，共用一个派生图缓存。
+    子类设置 extension，实现 render(content, out_path, image_dir, image_cache_dir, budget)，
+    并在 self.stats 里留下 images / image_bytes / pages / parts 统计。
+    """
+    extension = None
+
+    def __init__(self):
+        self.stats = {}
+
+    def render(self, content, out_path, image_dir, image_cache_dir, budget=None):
+        raise NotImplementedError
+
+# ------  PDF 渲染器  ------#
+PDF_FONT_PATH = '/Users/yanzhang/Library/Fonts/FangZhengHeiTiJianTi-1.ttf'
+TEXT_COLOR = '#D3D3D3'  # 米色 浅灰色: '#E0E0E0' 暖灰色: '#D3D3D3' 象牙色: '#FFFFF0'
+SITE_TITLE_COLOR = '#4169E1'  # Royal Blue
+
+# 每个进程只注册一次字体，失败结果也记住，避免每个文件都重新解析 TTF
+_PDF_FONT = None
+
+def register_pdf_font():
+    global _PDF_FONT
+    if _PDF_FONT is None:
         # 设置中文字体
         try:
-            pdfmetrics.registerFont(TTFont('PingFang', '/Users/yanzhang/Library/Fonts/FangZhengHeiTiJianTi-1.ttf'))
-            font_name = 'PingFang'
-            font_size = 40  # 增加字体大小，原来是12
-        except:
+            pdfmetrics.registerFont(TTFont('PingFang', PDF_FONT_PATH))
+            _PDF_FONT = ('PingFang', 40)  # 增加字体大小，原来是12
+        except Exception:
             print("无法加载中文字体，使用默认字体")
-            font_name = 'Helvetica'
-            font_size = 14
-            
-        def set_font():
-            c.setFont(font_name, font_size)
-            # c.setFillColor(colors.white)  # 设置文字颜色为白色
-            c.setFillColor(colors.HexColor('#D3D3D3'))  # 米色 浅灰色: '#E0E0E0' 暖灰色: '#D3D3D3' 象牙色: '#FFFFF0'
-            
-        draw_black_background()  # 初始页面绘制黑色背景
-        set_font()  # 初始设置字体
-        
+            _PDF_FONT = ('Helvetica', 14)
+    return _PDF_FONT
+
+class NewsPdfRenderer(NewsRenderer):
+    """
+    把 clean_and_format_text 的结果画成黑底 PDF。
+    字体按进程注册一次；每个 (字符, 字号) 的宽度只向 reportlab 查询一次，
+    换行时累加缓存的字符宽度，不再对每个前缀重复调用 stringWidth。
+    """
+    extension = 'pdf'
+
+    def __init__(self):
+        super().__init__()
+        self.font_name, self.font_size = register_pdf_font()
+        self.width, self.height = A4
+        self._char_widths = {}
+        self.c = None
+        self.y = 0
+        # 分卷状态：上限、已写出的各卷路径、当前卷的页数 / 嵌入字节数 / 开始时间
+        self.pdf_path = None
+        self.budget = NO_PART_BUDGET
+        self.part_paths = []
+        self._part_pages = 0
+        self._part_bytes = 0
+        self._part_start = 0.0
+
+    def char_width(self, ch, font_size):
+        key = (ch, font_size)
+        w = self._char_widths.get(key)
+        if w is None:
+            w = pdfmetrics.stringWidth(ch, self.font_name, font_size)
+            self._char_widths[key] = w
+        return w
+
+    def string_width(self, text, font_size):
+        return sum(self.char_width(ch, font_size) for ch in text)
+
+    def fit_chars(self, text, font_size, max_width):
+        """
+        返回从 text 开头起能放进 max_width 的字符数（宽度严格小于 max_width）。
+        """
+        total = 0.0
+        for i, ch in enumerate(text):
+            total += self.char_width(ch, font_size)
+            if total >= max_width:
+                return i
+        return len(text)
+
+    def split_text_for_display(self, text, font_size, max_width):
+        """
+        改进的文本分行处理，能更好地处理中英文混合文本：
+        尽量在空格处断开英文单词，放不下一个字符时强制放一个。
+        """
+        lines = []
+        remaining_text = text
+
+        while remaining_text:
+            # 逐字符添加，直到达到最大宽度
+            i = self.fit_chars(remaining_text, font_size, max_width)
+            current_line = remaining_text[:i]
+            # 记录空格的位置，用于英文单词的整体处理（包括刚好放不下的那个字符）
+            last_space_idx = remaining_text.rfind(' ', 0, i + 1)
+            # 处理英文单词切分的问题
+            # 如果当前行已有内容且找到了空格，则回退到最后一个空格处
+            if current_line and last_space_idx > 0 and i < len(remaining_text) and last_space_idx < i:
+                # 计算需要回退的字符数
+                back_chars = i - last_space_idx - 1
+                if back_chars > 0:
+                    # 回退到最后一个空格
+                    i = last_space_idx + 1
+                    current_line = current_line[:-back_chars]
+            # 如果一个字符都放不下（极少数情况），强制添加一个字符
+            if not current_line and i == 0:
+                current_line = remaining_text[0]
+                i = 1
+
+            lines.append(current_line)
+            remaining_text = remaining_text[i:]
+
+        return lines
+
+    def draw_black_background(self):
+        # 绘制黑色背景
+        self.c.setFillColor(colors.black)
+        self.c.rect(0, 0, self.width, self.height, fill=1)
+        # 重置填充颜色为浅灰色用于文本
+        self.c.setFillColor(colors.HexColor(TEXT_COLOR))
+
+    def set_font(self):
+        self.c.setFont(self.font_name, self.font_size)
+        self.c.setFillColor(colors.HexColor(TEXT_COLOR))
+
+    def open_part(self, path):
+        # invariant=1 去掉 PDF 中的创建时间和随机 ID，保证串行/并行渲染出的文件逐字节一致
+        self.c = canvas.Canvas(path, pagesize=A4, invariant=1)
+        self.part_paths.append(path)
+        self._part_pages = 1
+        self._part_bytes = 0
+        self._part_start = time.perf_counter()
+        self.draw_black_background()
+        self.set_font()
+
+    def part_full(self):
+        budget = self.budget
+        return bool(
+            (budget.max_pages and self._part_pages >= budget.max_pages)
+            or (budget.max_bytes and self._part_bytes >= budget.max_bytes)
+            or (budget.max_seconds and time.perf_counter() - self._part_start >= budget.max_seconds)
+        )
+
+    def new_page(self, top_margin):
+        if self.part_full():
+            # 当前卷写完落盘，后面的页面进入下一卷；已完成的卷此时就能打开
+            self.c.save()
+            print(f"已完成分卷: {os.path.basename(self.part_paths[-1])} ({self._part_pages} 页)")
+            self.open_part(get_pdf_part_path(self.pdf_path, len(self.part_paths) + 1))
+        else:
+            self.c.showPage()
+            self._part_pages += 1
+            self.draw_black_background()  # 新页面时重新绘制黑色背景
+            self.set_font()  # 新页面重新设置字体
+        self.stats["pages"] += 1
+        self.y = self.height - top_margin
+
+    def draw_image(self, img_path, img_filename, image_cache_dir):
+        # 不缓存 self.c：new_page 在分卷时会换成下一卷的 canvas
+        width = self.width
+        font_name, font_size = self.font_name, self.font_size
+
+        # 版面仍按原图尺寸计算（只读文件头），实际嵌入的是缓存里的缩放图
+        with Image.open(img_path) as img:
+            img_width, img_height = img.size
+        draw_path = get_image_derivative(img_path, image_cache_dir)
+
+        # 调整图片大小以适应页面（调小左右边距）
+        aspect = img_width / float(img_height)
+        if img_width > width - 0:   # 调整边距，例如总边距为20
+            img_width = width - 0
+            img_height = img_width / aspect
+
+        # 如果当前页空间不足，新建页面
+        if self.y < img_height + 80:  # 增加空间以容纳描述文字
+            self.new_page(30)
+
+        # 绘制图片
+        img_x = (width - img_width) / 2  # 图片水平居中
+        self.c.drawImage(draw_path, img_x, self.y - img_height + 20, width=img_width, height=img_height)
+        self.stats["images"] += 1
+        self.stats["image_bytes"] += os.path.getsize(img_path)
+        self._part_bytes += os.path.getsize(draw_path)
+
+        # 处理图片描述文字
+        description = os.path.splitext(img_filename)[0]  # 移除文件扩展名
+        self.c.setFont(font_name, font_size * 0.6)
+        self.c.setFillColor(colors.white)  # 确保描述文字为白色
+
+        # 计算描述文字的行数和位置
+        desc_font_size = font_size * 0.6
+        max_desc_width = width - 80  # 留出左右边距
+        desc_words = self.split_text_for_display(description, desc_font_size, max_desc_width)
+
+        # 计算描述文字实际占用的总高度
+        desc_total_height = len(desc_words) * (desc_font_size + 2)  # 每行文字高度加行间距
+
+        # 绘制描述文字
+        desc_y = self.y - img_height - 10
+        for line in desc_words:
+            line_width = self.string_width(line, desc_font_size)
+            desc_x = (width - line_width) / 2  # 文字水平居中
+            self.c.drawString(desc_x, desc_y, line)
+            desc_y -= desc_font_size + 4  # 行间距
+
+        self.set_font()  # 恢复原来的字体大小
+        # 动态计算需要的间距
+        min_spacing = 50  # 最小间距
+        # 使用对数函数来计算额外间距，这样行数越多，每行增加的间距越小
+        if len(desc_words) > 1:
+            extra_spacing = 10 * math.log2(len(desc_words))  # 可以调整这个系数(10)来控制间距增长速度
+        else:
+            extra_spacing = 0
+        total_spacing = min_spacing + desc_total_height + extra_spacing
+
+        # 更新y坐标
+        self.y -= (img_height + total_spacing)
+
+    def draw_site_title(self, text, line_height):
+        # 左对齐显示
+        x_left = 20  # 可以调整这个值来改变左边距
+
+        # 检查是否需要换页（换页可能换到下一卷的 canvas，所以先换页再取 self.c 设置字体）
+        if self.y < 30:
+            self.new_page(40)
+
+        # 设置更大的字体和蓝色
+        c = self.c
+        c.setFont(self.font_name, self.font_size * 1.5)
+        c.setFillColor(colors.HexColor(SITE_TITLE_COLOR))
+
+        # 绘制网站名称
+        c.drawString(x_left, self.y, text)
+
+        # 恢复原来的字体设置和颜色
+        c.setFont(self.font_name, self.font_size)
+        c.setFillColor(colors.HexColor(TEXT_COLOR))
+
+        # 更新y坐标
+        self.y -= line_height * 1.5
+
+    def draw_paragraph(self, text, x, line_height):
+        max_width = self.width - 30  # 减小文本区域边距，原来是100
+
+        while text:
+            # 计算当前行可以容纳的文字
+            i = self.fit_chars(text, self.font_size, max_width)
+            line = text[:i]
+
+            # 如果一个字符都放不下，强制换页
+            if not line:
+                line = text[0]
+                i = 1
+
+            # 检查是否需要换页
+            if self.y < 30:  # 减小底部边距，原来是50
+                self.new_page(40)
+
+            # 绘制当前行
+            self.c.drawString(x, self.y, line)
+            self.y -= line_height
+
+            # 更新剩余文本
+            text = text[i:]
+
+        # 段落间距
+        self.y -= 10  # 减小段落间距，原来是10
+
+    def render(self, content, pdf_path, image_dir, image_cache_dir, budget=None):
+        """
+        budget 为 PdfPartBudget 且有非 0 上限时按卷输出 News_X_part1.pdf、News_X_part2.pdf……，
+        每卷在换页时检查上限，写满即落盘；最后只有一卷时仍命名为 News_X.pdf。
+        """
+        self.pdf_path = pdf_path
+        self.budget = budget or NO_PART_BUDGET
+        split = any(self.budget)
+        self.part_paths = []
+        self.stats = {"images": 0, "image_bytes": 0, "pages": 1}
+        # 创建PDF文档，初始页面绘制黑色背景并设置字体
+        self.open_part(get_pdf_part_path(pdf_path, 1) if split else pdf_path)
+
         x = 20  # 减小左边距，原来是50
-        y = height - 30  # 减小上边距，原来是height - 50
+        self.y = self.height - 30  # 减小上边距，原来是height - 50
         line_height = 60  # 减小行高，原来是20
-        
-        paragraphs = content.splitlines()
-        
-        for paragraph in paragraphs:
-            if '--IMAGE_PLACEHOLDER_' in paragraph:
-                img_filename = paragraph.replace('--IMAGE_PLACEHOLDER_', '').replace('--', '').strip()
-                img_path = os.path.join(image_dir, img_filename)
-                
+
+        for kind, value in iter_content_blocks(content):
+            if kind == 'image':
+                img_path = os.path.join(image_dir, value)
                 if os.path.exists(img_path):
                     try:
-                        img = Image.open(img_path)
-                        img_width, img_height = img.size
-                        
-                        # 调整图片大小以适应页面（调小左右边距）
-                        aspect = img_width / float(img_height)
-                        if img_width > width - 0:   # 调整边距，例如总边距为20
-                            img_width = width - 0
-                            img_height = img_width / aspect
-                        
-                        # 如果当前页空间不足，新建页面
-                        if y < img_height + 80:  # 增加空间以容纳描述文字
-                            c.showPage()
-                            draw_black_background()  # 新页面时重新绘制黑色背景
-                            set_font()
-                            y = height - 30
-                            
-                        # 绘制图片
-                        img_x = (width - img_width) / 2  # 图片水平居中
-                        c.drawImage(img_path, img_x, y - img_height + 20, width=img_width, height=img_height)
-                        
-                        # 处理图片描述文字
-                        description = os.path.splitext(img_filename)[0]  # 移除文件扩展名
-                        c.setFont(font_name, font_size * 0.6)
-                        c.setFillColor(colors.white)  # 确保描述文字为白色
-                        
-                        # 计算描述文字的行数和位置
-                        desc_font_size = font_size * 0.6
-                        max_desc_width = width - 80  # 留出左右边距
-
-                        # 改进的文本分行处理，能更好地处理中英文混合文本
-                        def split_text_for_display(text, font_name, font_size, max_width, canvas):
-                            lines = []
-                            remaining_text = text
-                            
-                            while remaining_text:
-                                # 初始化当前行
-                                current_line = ""
-                                i = 0
-                                last_space_idx = -1  # 用于记录上一个空格的位置
-                                
-                                # 逐字符添加，直到达到最大宽度
-                                while i < len(remaining_text):
-                                    # 记录空格的位置，用于英文单词的整体处理
-                                    if remaining_text[i] == ' ':
-                                        last_space_idx = i
-                                    test_line = current_line + remaining_text[i]
-                                    if canvas.stringWidth(test_line, font_name, font_size) < max_width:
-                                        current_line = test_line
-                                        i += 1
-                                    else:
-                                        break
-                                # 处理英文单词切分的问题
-                                # 如果当前行已有内容且找到了空格，则回退到最后一个空格处
-                                if current_line and last_space_idx > 0 and i < len(remaining_text) and last_space_idx < i:
-                                    # 计算需要回退的字符数
-                                    back_chars = i - last_space_idx - 1
-                                    if back_chars > 0:
-                                        # 回退到最后一个空格
-                                        i = last_space_idx + 1
-                                        current_line = current_line[:-back_chars]
-                                # 如果一个字符都放不下（极少数情况），强制添加一个字符
-                                if not current_line and i == 0:
-                                    current_line = remaining_text[0]
-                                    i = 1
-                                
-                                lines.append(current_line)
-                                remaining_text = remaining_text[i:]
-                            
-                            return lines
-
-                        # 使用改进的函数处理描述文字
-                        desc_words = split_text_for_display(description, font_name, desc_font_size, max_desc_width, c)
-
-                        # 计算描述文字实际占用的总高度
-                        desc_total_height = len(desc_words) * (desc_font_size + 2)  # 每行文字高度加行间距
-
-                        # 绘制描述文字
-                        desc_y = y - img_height - 10
-                        for line in desc_words:
-                            line_width = c.stringWidth(line, font_name, desc_font_size)
-                            desc_x = (width - line_width) / 2  # 文字水平居中
-                            c.drawString(desc_x, desc_y, line)
-                            desc_y -= desc_font_size + 4  # 行间距
-                        
-                        set_font()  # 恢复原来的字体大小
-                        # 动态计算需要的间距
-                        min_spacing = 50  # 最小间距
-                        # 使用对数函数来计算额外间距，这样行数越多，每行增加的间距越小
-                        if len(desc_words) > 1:
-                            extra_spacing = 10 * math.log2(len(desc_words))  # 可以调整这个系数(10)来控制间距增长速度
-                        else:
-                            extra_spacing = 0
-                        total_spacing = min_spacing + desc_total_height + extra_spacing
-
-                        # 更新y坐标
-                        y -= (img_height + total_spacing)
-                        
+                        self.draw_image(img_path, value, image_cache_dir)
                     except Exception as e:
                         print(f"处理图片时出错: {str(e)}")
-                        
+            elif kind == 'site':
+                self.draw_site_title(value, line_height)
             else:
-                # 处理文本段落
-                # text = paragraph.strip()
-                # 处理文本段落
-                text = paragraph.strip()
-                # 去掉 BOM、常见中英文标点
-                text = text.lstrip('\ufeff').lstrip("：:。.，,")
-                upper = text.upper()
-
-                # 检查是否是主要新闻网站名称
-                # major_news_sites = {
-                #     'FT',
-                #     'WSJ',
-                #     'BLOOMBERG',
-                #     'REUTERS',
-                #     'NYTIMES',
-                #     'WASHINGTONPOST',
-                #     'ECONOMIST',
-                #     'TECHNOLOGYREVIEW',
-                #     'OTHER',
-                # }
-                # if text.upper() in {site.upper() for site in major_news_sites}:
-                if any(upper.startswith(site) for site in MAJOR_SITES):
-                    # 保存当前字体设置和颜色
-                    current_font_size = font_size
-                    
-                    # 设置更大的字体和蓝色
-                    c.setFont(font_name, font_size * 1.5)
-                    c.setFillColor(colors.HexColor('#4169E1'))  # Royal Blue
-                    
-                    # 左对齐显示
-                    x_left = 20  # 可以调整这个值来改变左边距
-                    
-                    # 检查是否需要换页
-                    if y < 30:
-                        c.showPage()
-                        draw_black_background()
-                        set_font()
-                        y = height - 40
-                        
-                    # 绘制网站名称
-                    c.drawString(x_left, y, text)
-                    
-                    # 恢复原来的字体设置和颜色
-                    c.setFont(font_name, current_font_size)
-                    # c.setFillColor(colors.white)  # 直接设置回白色
-                    c.setFillColor(colors.HexColor('#D3D3D3'))  # 米色 浅灰色: '#E0E0E0' 暖灰色: '#D3D3D3' 象牙色: '#FFFFF0'
-                    
-                    # 更新y坐标
-                    y -= line_height * 1.5
-                else:
-                    max_width = width - 30  # 减小文本区域边距，原来是100
-                    
-                    while text:
-                        # 计算当前行可以容纳的文字
-                        line = ''
-                        i = 0
-                        while i < len(text):
-                            if c.stringWidth(line + text[i]) < max_width:
-                                line += text[i]
-                                i += 1
-                            else:
-                                break
-                        
-                        # 如果一个字符都放不下，强制换页
-                        if not line:
-                            line = text[0]
-                            i = 1
-                        
-                        # 检查是否需要换页
-                        if y < 30:  # 减小底部边距，原来是50
-                            c.showPage()
-                            draw_black_background()  # 新页面时重新绘制黑色背景
-                            set_font()  # 新页面重新设置字体
-                            y = height - 40
-                        
-                        # 绘制当前行
-                        c.drawString(x, y, line)
-                        y -= line_height
-                        
-                        # 更新剩余文本
-                        text = text[i:]
-                    
-                    # 段落间距
-                    y -= 10  # 减小段落间距，原来是10
-        
-        c.save()
+                self.draw_paragraph(value, x, line_height)
+
+        self.c.save()
+        self.c = None
+        if split and len(self.part_paths) == 1:
+            os.replace(self.part_paths[0], pdf_path)
+            self.part_paths = [pdf_path]
+        # 清掉上一次渲染留下、这次没有再生成的卷（比如分卷数变少，或从分卷改回单文件）
+        for stale in list_render_outputs(pdf_path):
+            if stale not in self.part_paths:
+                os.remove(stale)
+        self.stats["parts"] = len(self.part_paths)
+        return True
+
+# ------  EPUB 渲染器  ------#
+EPUB_CSS = f"""
+body {{ background: #000000; color: {TEXT_COLOR}; line-height: 1.6; margin: 0 0.6em; }}
+h2 {{ color: {SITE_TITLE_COLOR}; font-size: 1.4em; margin: 1.2em 0 0.6em; }}
+p {{ margin: 0 0 0.8em; }}
+figure {{ margin: 1em 0; text-align: center; }}
+img {{ max-width: 100%; height: auto; }}
+figcaption {{ font-size: 0.7em; color: #FFFFFF; }}
+"""
+# XML 不允许的控制字符
+_XML_INVALID_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# 固定 zip 内的时间戳和 dcterms:modified，同样的内容生成同样的文件
+_EPUB_ZIP_TIME = (1980, 1, 1, 0, 0, 0)
+_EPUB_MODIFIED = '%04d-%02d-%02dT%02d:%02d:%02dZ' % _EPUB_ZIP_TIME
+
+def _xml_text(text):
+    return html.escape(_XML_INVALID_RE.sub('', text))
+
+def _xhtml_page(title, body):
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+        'lang="zh-CN" xml:lang="zh-CN">\n'
+        f'<head><meta charset="utf-8"/><title>{_xml_text(title)}</title>'
+        '<link rel="stylesheet" type="text/css" href="style.css"/></head>\n'
+        f'<body>\n{body}\n</body>\n</html>\n'
+    )
+
+class NewsEpubRenderer(NewsRenderer):
+    """
+    输出可重排的 EPUB 3：每个站点一个章节，手机阅读器按屏幕宽度重排文字，
+    不用像 40pt 的 A4 PDF 那样缩放、拖动；章节文件小，翻页也快。
+    只用标准库 zipfile 写出，图片直接打包 PDF 同一份派生图缓存里的文件。
+    """
+    extension = 'epub'
+
+    def render(self, content, out_path, image_dir, image_cache_dir, budget=None):
+        # EPUB 是重排格式，没有页的概念，分卷上限只对 PDF 生效；pages 记录章节数
+        self.stats = {"images": 0, "image_bytes": 0, "pages": 0, "parts": 1}
+        title = os.path.splitext(os.path.basename(out_path))[0]
+        chapters = [[title, []]]   # [章节标题, [xhtml 片段]]
+        media = {}                  # 派生图路径 -> EPUB 内的文件名
+        has_body = False            # 当前章节是否已有标题以外的内容
+
+        for kind, value in iter_content_blocks(content):
+            if kind == 'site':
+                # 连续的站点标题归入同一章，不生成只有标题的空章节
+                if has_body:
+                    chapters.append([value, []])
+                    has_body = False
+                elif not chapters[-1][1]:
+                    chapters[-1][0] = value
+                chapters[-1][1].append(f"<h2>{_xml_text(value)}</h2>")
+            elif kind == 'image':
+                img_path = os.path.join(image_dir, value)
+                if not os.path.exists(img_path):
+                    continue
+                try:
+                    draw_path = get_image_derivative(img_path, image_cache_dir)
+                except Exception as e:
+                    print(f"处理图片时出错: {str(e)}")
+                    continue
+                if draw_path not in media:
+                    media[draw_path] = f"images/{len(media) + 1}{os.path.splitext(draw_path)[1].lower()}"
+                description = _xml_text(os.path.splitext(value)[0])
+                chapters[-1][1].append(
+                    f'<figure><img src="{media[draw_path]}" alt="{description}"/>'
+                    f'<figcaption>{description}</figcaption></figure>'
+                )
+                self.stats["images"] += 1
+                self.stats["image_bytes"] += os.path.getsize(img_path)
+                has_body = True
+            elif value:
+                chapters[-1][1].append(f"<p>{_xml_text(value)}</p>")
+                has_body = True
+
+        chapters = [chapter for chapter in chapters if chapter[1]]
+        self.write_epub(out_path, title, chapters, media)
+        self.stats["pages"] = len(chapters)
         return True
+
+    def write_epub(self, out_path, title, chapters, media):
+        book_id = hashlib.sha256(
+            '\n'.join([title] + ['\n'.join(body) for _, body in chapters]).encode('utf-8')
+        ).hexdigest()
+
+        manifest_items = [
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+            '<item id="css" href="style.css" media-type="text/css"/>',
+        ]
+        spine_items = []
+        nav_items = []
+        for i, (chapter_title, _) in enumerate(chapters, 1):
+            manifest_items.append(f'<item id="c{i}" href="chapter{i}.xhtml" media-type="application/xhtml+xml"/>')
+            spine_items.append(f'<itemref idref="c{i}"/>')
+            nav_items.append(f'<li><a href="chapter{i}.xhtml">{_xml_text(chapter_title)}</a></li>')
+        for i, name in enumerate(media.values(), 1):
+            media_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            manifest_items.append(f'<item id="img{i}" href="{name}" media-type="{media_type}"/>')
+
+        opf = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="zh-CN">\n'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f'<dc:identifier id="book-id">urn:sha256:{book_id}</dc:identifier>\n'
+            f'<dc:title>{_xml_text(title)}</dc:title>\n'
+            '<dc:language>zh-CN</dc:language>\n'
+            f'<meta property="dcterms:modified">{_EPUB_MODIFIED}</meta>\n'
+            '</metadata>\n'
+            '<manifest>\n' + '\n'.join(manifest_items) + '\n</manifest>\n'
+            '<spine>\n' + '\n'.join(spine_items) + '\n</spine>\n'
+            '</package>\n'
+        )
+        container = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+            '</container>\n'
+        )
+        nav = _xhtml_page(title, '<nav epub:type="toc"><ol>\n' + '\n'.join(nav_items) + '\n</ol></nav>')
+
+        tmp_path = out_path + ".tmp"
+        with zipfile.ZipFile(tmp_path, 'w') as zf:
+            def add(name, data, compress=True):
+                info = zipfile.ZipInfo(name, date_time=_EPUB_ZIP_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+                zf.writestr(info, data)
+            # mimetype 必须是第一个文件且不压缩
+            add('mimetype', 'application/epub+zip', compress=False)
+            add('META-INF/container.xml', container)
+            add('OEBPS/content.opf', opf)
+            add('OEBPS/nav.xhtml', nav)
+            add('OEBPS/style.css', EPUB_CSS)
+            for i, (chapter_title, body) in enumerate(chapters, 1):
+                add(f'OEBPS/chapter{i}.xhtml', _xhtml_page(chapter_title, '\n'.join(body)))
+            for draw_path, name in media.items():
+                with open(draw_path, 'rb') as f:
+                    # 图片本身已经压缩过，直接存储
+                    add(f'OEBPS/{name}', f.read(), compress=False)
+        os.replace(tmp_path, out_path)
+
+# ------  渲染后端注册  ------#
+RENDERER_CLASSES = {
+    "pdf": NewsPdfRenderer,
+    "epub": NewsEpubRenderer,
+}
+
+# 每个进程每种格式一个渲染器实例，PDF 的字符宽度缓存跨文件复用
+_RENDERERS = {}
+
+def get_renderer(fmt):
+    renderer = _RENDERERS.get(fmt)
+    if renderer is None:
+        renderer = _RENDERERS[fmt] = RENDERER_CLASSES[fmt]()
+    return renderer
+
+def get_pdf_renderer():
+    return get_renderer("pdf")
+
+def render_news_outputs(txt_path, targets, article_copier_path, image_dir, articles=None,
+                        image_cache_dir=None, part_budget=None):
+    """
+    一次解析、一次清洗，然后依次交给各个输出后端。targets 为 {格式: 输出路径}。
+    返回 {格式: (是否成功, 错误信息, 统计)}；统计在当前进程里测量，并行时 CPU 时间也是子进程自己的。
+    """
+    if image_cache_dir is None:
+        image_cache_dir = os.path.join(os.path.dirname(txt_path), IMAGE_CACHE_DIR_NAME)
+    prepare_start = time.perf_counter()
+    content, images = clean_and_format_text(txt_path, article_copier_path, image_dir, articles)
+    prepare_wall = round(time.perf_counter() - prepare_start, 4)
+    if not content:
+        return {fmt: (False, None, {}) for fmt in targets}
+
+    results = {}
+    for fmt, out_path in targets.items():
+        print(f"\n开始创建{fmt.upper()}: {out_path}")
+        print(f"图片数量: {len(images)}")
+        renderer = get_renderer(fmt)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            ok = renderer.render(content, out_path, image_dir, image_cache_dir, part_budget)
+            error = None
+        except Exception as e:
+            ok, error = False, str(e)
+        render_stats = renderer.stats if ok else {}
+        stats = {
+            "format": fmt,
+            "prepare_wall": prepare_wall,
+            "wall": round(time.perf_counter() - wall_start, 4),
+            "cpu": round(time.process_time() - cpu_start, 4),
+            "bytes_read": os.path.getsize(txt_path) + render_stats.get("image_bytes", 0),
+            "bytes_written": sum(os.path.getsize(path) for path in list_render_outputs(out_path)) if ok else 0,
+            "images": render_stats.get("images", 0),
+            "pages": render_stats.get("pages", 0),
+            "parts": render_stats.get("parts", 0),
+        }
+        results[fmt] = (ok, error, stats)
+    return results
+
+def txt_to_pdf_with_formatting(txt_path, pdf_path, article_copier_path, image_dir, articles=None,
+                               image_cache_dir=None, part_budget=None):
+    try:
+        if image_cache_dir is None:
+            image_cache_dir = os.path.join(os.path.dirname(pdf_path), IMAGE_CACHE_DIR_NAME)
+        ok, error, _ = render_news_outputs(txt_path, {"pdf": pdf_path}, article_copier_path, image_dir,
+                                           articles, image_cache_dir, part_budget)["pdf"]
+        if error is not None:
+            print(f"转换过程中出现错误: {error}")
+        return ok
         
     except Exception as e:
         print(f"转换过程中出现错误: {str(e)}")
@@ -485,48 +1169,32 @@ def txt_to_pdf_with_formatting(txt_path, pdf_path, article_copier_path, image_di
     
 def extract_site_name(url):
     try:
-        # 移除 http:// 或 https:// 前缀
-        url = re.sub(r'^https?://(www\.)?', '', url.lower())
-        
-        # 常见新闻网站的特殊处理
-        if 'ft.com' in url:  # 修改为使用包含判断
-            return 'FT'
-        elif 'wsj.com' in url:  # 修改为使用包含判断，这样cn.wsj.com也能被正确识别
-            return 'WSJ'
-        elif 'bloomberg.com' in url:
-            return 'BLOOMBERG'
-        elif 'reuters.com' in url:
-            return 'REUTERS'
-        elif 'nytimes.com' in url:
-            return 'NYTIMES'
-        elif 'washingtonpost.com' in url:
-            return 'WASHINGTONPOST'
-        elif 'economist.com' in url:
-            return 'ECONOMIST'
-        elif 'technologyreview.com' in url:
-            return 'TECHNOLOGYREVIEW'
-        
-        # 对于其他网站，提取域名主体
-        domain = url.split('/')[0]
-        # 提取主域名
-        parts = domain.split('.')
-        if len(parts) >= 2:
-            # 查找主域名（通常是倒数第二个部分）
-            main_domain = parts[-2]
-            site_name = main_domain.upper()
-        else:
-            # 否则只使用主域名
-            site_name = parts[0].upper()
-            
-        return site_name
-        
+        return resolve_site(url)[0]
     except Exception as e:
         print(f"提取网站名称时出错 ({url}): {str(e)}")
         return "Other" # 出错时返回 Other
-    
-def process_all_files(directory, article_copier_path, image_dir):
+
+def convert_news_file(txt_file, targets, article_copier_path, image_dir, articles=None, part_budget=None):
     """
-    仅将 News_*.txt 文件转换为 PDF，不移动源文件。
+    转换单个 txt 文件的所有待生成格式，供串行和进程池两种模式共用。
+    targets 为 {格式: 输出路径}；articles 是主进程已经解析好的文章列表，传给子进程后不必再读一遍 txt。
+    返回 (txt_file, {格式: (是否成功, 错误信息, 统计)})，异常在这里吃掉，避免拖垮整个进程池。
+    """
+    try:
+        return txt_file, render_news_outputs(txt_file, targets, article_copier_path, image_dir, articles,
+                                             part_budget=part_budget)
+    except Exception as e:
+        return txt_file, {fmt: (False, str(e), {"format": fmt}) for fmt in targets}
+
+def process_all_files(directory, article_copier_path, image_dir, workers=1, recorder=None, part_budget=None,
+                      formats=("pdf",)):
+    """
+    将 News_*.txt 文件转换为 formats 中的各种格式（pdf / epub），不移动源文件。
+    同一个 txt 的各种格式共用一次解析和清洗，只为需要重建的格式渲染。
+    workers > 1 时使用进程池，把各个文件的渲染分散到多个 CPU 核上。
+    传入 recorder (RunRecorder) 时，每个生成的文件都会写一条耗时 / 字节数 / 图片数记录。
+    part_budget (PdfPartBudget) 控制单个 PDF 的分卷上限，默认不分卷。
+    只有 REQUIRED_FORMATS 中的格式失败时返回 False，附加格式失败单独计数，下次运行会按指纹重试。
     """
     txt_files = find_all_news_files(directory)
     
@@ -537,57 +1205,218 @@ def process_all_files(directory, article_copier_path, image_dir):
     converted = 0
     skipped = 0
     failed = 0
+    optional_failed = 0
     
+    # 读取增量构建清单，按内容指纹判断是否需要重新渲染
+    manifest = load_build_manifest(directory)
+    url_images = UrlImageIndex(parse_article_copier(article_copier_path))
+    fingerprints = {}
+    digest_cache = image_digest_cache(image_dir, os.path.join(directory, IMAGE_CACHE_DIR_NAME))
+    
+    # 先筛出需要转换的 (文件, 格式)，跳过的直接计数
+    pending = []
     for txt_file in txt_files:
-        pdf_file = get_pdf_path(txt_file)
-        
         try:
-            if needs_conversion(txt_file, pdf_file):
-                print(f"正在处理: {os.path.basename(txt_file)}")
-                if txt_to_pdf_with_formatting(txt_file, pdf_file, article_copier_path, image_dir):
-                    print(f"成功转换: {os.path.basename(txt_file)} -> {os.path.basename(pdf_file)}")
-                    converted += 1
+            source = compute_source_fingerprint(load_articles(txt_file), url_images, image_dir, digest_cache)
+            targets = {}
+            for fmt in formats:
+                out_path = get_output_path(txt_file, fmt)
+                fingerprints[out_path] = compute_output_fingerprint(source, fmt, part_budget)
+                if needs_conversion(txt_file, out_path, fingerprints[out_path], manifest):
+                    targets[fmt] = out_path
                 else:
-                    print(f"转换失败: {os.path.basename(txt_file)}")
-                    failed += 1
-            else:
-                print(f"跳过已存在的文件: {os.path.basename(txt_file)}")
-                skipped += 1
-                
+                    print(f"跳过已存在的文件: {os.path.basename(out_path)}")
+                    skipped += 1
+            if targets:
+                pending.append((txt_file, targets))
         except Exception as e:
             print(f"处理 {os.path.basename(txt_file)} 时出错: {str(e)}")
             failed += 1
+    # 先把图片摘要落盘，进程池里的子进程生成派生图时直接读取，不再重新哈希
+    digest_cache.forget_missing()
+    if digest_cache.dirty:
+        os.makedirs(os.path.dirname(digest_cache.cache_path), exist_ok=True)
+    digest_cache.save()
+    
+    def record(txt_file, results):
+        nonlocal converted, failed, optional_failed
+        for fmt, (ok, error, stats) in results.items():
+            out_path = get_output_path(txt_file, fmt)
+            if recorder is not None:
+                recorder.emit("file", stage="TXT 转 PDF", file=os.path.basename(txt_file),
+                              status="done" if ok else "failed", **stats)
+            if not ok and fmt not in REQUIRED_FORMATS:
+                print(f"警告: {os.path.basename(txt_file)} 的 {fmt.upper()} 生成失败，不影响其他格式: {error}")
+                optional_failed += 1
+            elif error is not None:
+                print(f"处理 {os.path.basename(txt_file)} ({fmt}) 时出错: {error}")
+                failed += 1
+            elif ok:
+                parts = [os.path.basename(path) for path in list_render_outputs(out_path)]
+                print(f"成功转换: {os.path.basename(txt_file)} -> {', '.join(parts)}")
+                manifest[os.path.basename(out_path)] = {
+                    "txt": os.path.basename(txt_file),
+                    "fingerprint": fingerprints[out_path],
+                    "parts": parts,
+                }
+                converted += 1
+            else:
+                print(f"转换失败: {os.path.basename(txt_file)} ({fmt})")
+                failed += 1
+    
+    workers = min(workers or 1, len(pending))
+    if workers > 1:
+        print(f"使用 {workers} 个进程并行转换 {len(pending)} 个文件")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(convert_news_file, txt_file, targets, article_copier_path, image_dir,
+                                load_articles(txt_file), part_budget)
+                for txt_file, targets in pending
+            ]
+            for future in as_completed(futures):
+                try:
+                    record(*future.result())
+                except Exception as e:
+                    # 子进程意外退出（如被系统杀掉）时 future 本身会抛异常
+                    print(f"并行转换子进程异常: {str(e)}")
+                    failed += 1
+    else:
+        for txt_file, targets in pending:
+            print(f"正在处理: {os.path.basename(txt_file)}")
+            record(*convert_news_file(txt_file, targets, article_copier_path, image_dir,
+                                      load_articles(txt_file), part_budget))
+    
+    if converted:
+        save_build_manifest(directory, manifest)
+
+    # 所有渲染结束后清理派生图缓存：只保留图片目录里现存图片的派生图，并限制总大小
+    removed, freed = prune_image_cache(os.path.join(directory, IMAGE_CACHE_DIR_NAME),
+                                       {entry["md5"] for entry in digest_cache.entries.values()})
+    if removed:
+        print(f"图片缓存: 删除 {removed} 个派生图，释放 {freed / 1024 / 1024:.1f} MB")
     
     print(f"\n处理总结:")
     print(f"  成功转换: {converted} 个文件")
     print(f"  跳过处理: {skipped} 个文件")
     print(f"  转换失败: {failed} 个文件")
+    if optional_failed:
+        print(f"  附加格式失败: {optional_failed} 个文件")
 
     return failed == 0
 
 # ------  整个pdf逻辑部分结束  ------#
 
-# ---- 站点显示名称映射（不区分大小写） ----测试
-SITE_DISPLAY_MAP = {
-    'ft':             '伦敦金融时报',
-    'nytimes':        '纽约时报',
-    'washingtonpost': '华盛顿邮报',
-    'economist':      '经济学人',
-    'technologyreview': '麻省理工技术评论',
-    'techreview':       '麻省理工技术评论',   # 以防 HTML 里写的是 TechReview
-    'wsj':            '华尔街日报',
-    'wsjcn':          '华尔街日报中文网',
-    'reuters':        '路透社',
-    'bloomberg':      '布隆伯格金融',
-    'nikkeiasia':     '日经新闻亚洲版',
-}
+# 哈希时的读缓冲区：1 MB，配合 readinto 复用同一块内存
+HASH_BUFFER_SIZE = 1024 * 1024
+
+def _hash_file(path, hasher):
+    buf = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+def compute_sha256(path):
+    return _hash_file(path, hashlib.sha256())
 
 def compute_md5(path):
-    hash_md5 = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    return _hash_file(path, hashlib.md5())
+
+MD5_CACHE_NAME = ".md5_cache.json"
+
+class Md5Cache:
+    """
+    持久化的 MD5 缓存：以 (size, mtime_ns, inode) 判断文件是否变化，
+    没变的文件直接复用上次的摘要。键是相对 base_dir 的路径；cache_path 默认为 base_dir/.md5_cache.json。
+    """
+    def __init__(self, base_dir, cache_path=None):
+        self.base_dir = base_dir
+        self.cache_path = cache_path or os.path.join(base_dir, MD5_CACHE_NAME)
+        self.dirty = False
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def _key(self, path):
+        return os.path.relpath(path, self.base_dir)
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def lookup(self, path):
+        entry = self.entries.get(self._key(path))
+        if entry and entry.get("sig") == self._signature(path):
+            return entry["md5"]
+        return None
+
+    def store(self, path, sig, md5):
+        self.entries[self._key(path)] = {"sig": sig, "md5": md5}
+        self.dirty = True
+
+    def get_or_compute(self, path):
+        """
+        返回 path 的 MD5：缓存命中直接返回，否则计算并记入缓存（单个文件，不打印统计）。
+        """
+        md5 = self.lookup(path)
+        if md5 is None:
+            # 先取签名再读内容，读的过程中文件被改写时下次会重新计算
+            sig = self._signature(path)
+            md5 = compute_md5(path)
+            self.store(path, sig, md5)
+        return md5
+
+    def digest_many(self, paths, workers=1):
+        """
+        返回 {path: md5}。命中缓存的直接返回，其余的重新计算；
+        workers > 1 时用线程池并行计算（hashlib 处理大块数据时会释放 GIL）。
+        """
+        results = {}
+        misses = []
+        for path in dict.fromkeys(paths):
+            md5 = self.lookup(path)
+            if md5 is None:
+                misses.append((path, self._signature(path)))
+            else:
+                results[path] = md5
+
+        if workers > 1 and len(misses) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                digests = list(executor.map(compute_md5, [path for path, _ in misses]))
+        else:
+            digests = [compute_md5(path) for path, _ in misses]
+
+        for (path, sig), md5 in zip(misses, digests):
+            self.store(path, sig, md5)
+            results[path] = md5
+        if misses:
+            print(f"MD5 缓存: 命中 {len(results) - len(misses)} 个，重新计算 {len(misses)} 个")
+        return results
+
+    def digest(self, path):
+        return self.digest_many([path])[path]
+
+    def forget_missing(self):
+        # 清掉已经被删除的文件，防止缓存无限增长
+        stale = [k for k in self.entries if not os.path.exists(os.path.join(self.base_dir, k))]
+        for k in stale:
+            del self.entries[k]
+        if stale:
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        with atomic_write(self.cache_path) as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        self.dirty = False
 
 def find_all_news_files(directory):
     pattern = os.path.join(directory, "News_*.txt")
@@ -739,26 +1568,267 @@ def normalize_url(u):
     new = urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/'), '', ''))
     return new
 
-def generate_news_json(news_directory, today):
+# ------  原子写入与 JSON 文档缓存  ------#
+@contextlib.contextmanager
+def atomic_write(path, encoding='utf-8'):
+    """
+    先写 path.tmp，fsync 后 rename 覆盖 path，再 fsync 所在目录。
+    读者要么看到旧文件，要么看到完整的新文件，不会读到写了一半的内容。
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+class JsonDocumentStore:
+    """
+    一次运行内共享的 JSON 文档缓存：同一个文件只读一次，各处的修改都改内存里的同一份数据，
+    mark_dirty 之后等 flush 时才用 atomic_write 写一次。
+    compact=True 时输出不带缩进和多余空格，否则和原来一样 indent=4。
+    """
+    def __init__(self, compact=False):
+        self.compact = compact
+        self._docs = {}         # 绝对路径 -> 数据
+        self._dirty = {}        # 绝对路径 -> 写入后的回调（可为 None），保持标记顺序
+
+    def load(self, path, default=None):
+        """读取并缓存 path；文件不存在时用 default 作初始数据（default 为 None 则抛 FileNotFoundError）。"""
+        path = os.path.abspath(path)
+        if path not in self._docs:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._docs[path] = json.load(f)
+            except FileNotFoundError:
+                if default is None:
+                    raise
+                self._docs[path] = default
+        return self._docs[path]
+
+    def mark_dirty(self, path, after_flush=None):
+        # after_flush(data) 在文件落盘后调用，用于刷新依赖文件 stat 的附属索引
+        self._dirty[os.path.abspath(path)] = after_flush
+
+    def is_dirty(self, path):
+        return os.path.abspath(path) in self._dirty
+
+    def flush(self, exclude=()):
+        """写出所有待写的文档；exclude 中的路径留到之后再写。返回写出的路径列表。"""
+        exclude = {os.path.abspath(p) for p in exclude}
+        written = []
+        for path in [p for p in self._dirty if p not in exclude]:
+            after_flush = self._dirty.pop(path)
+            with atomic_write(path) as f:
+                if self.compact:
+                    json.dump(self._docs[path], f, ensure_ascii=False, separators=(',', ':'))
+                else:
+                    json.dump(self._docs[path], f, ensure_ascii=False, indent=4)
+            print(f"已写入: {path}")
+            if after_flush is not None:
+                after_flush(self._docs[path])
+            written.append(path)
+        return written
+
+# ------  流式分组 JSON 读写  ------#
+class GroupedJsonSpool:
+    """
+    按组把条目暂存到磁盘（每组一个 JSON Lines 临时文件），最后按组依次输出成
+    {"组名": [条目, ...], ...} 结构。内存里只保留组名和打开的文件句柄，
+    条目数量再多峰值内存也基本不变。indent=4 时输出和 json.dump(indent=4) 逐字节一致。
+    """
+    def __init__(self, tmp_dir=None):
+        self._tmp = tempfile.TemporaryDirectory(prefix="onews_spool_", dir=tmp_dir)
+        self._groups = {}  # 组名 -> (文件句柄, 条目数)，保持首次出现的顺序
+
+    def touch(self, group):
+        # 登记一个组（可以是空组），决定它在输出中的位置
+        if group not in self._groups:
+            path = os.path.join(self._tmp.name, f"{len(self._groups)}.jsonl")
+            self._groups[group] = [open(path, 'w+', encoding='utf-8'), 0]
+        return self._groups[group]
+
+    def add(self, group, entry):
+        slot = self.touch(group)
+        slot[0].write(json.dumps(entry, ensure_ascii=False) + '\n')
+        slot[1] += 1
+
+    def __len__(self):
+        return sum(count for _, count in self._groups.values())
+
+    def _iter_entries(self, group):
+        fh = self._groups[group][0]
+        fh.flush()
+        fh.seek(0)
+        for line in fh:
+            yield json.loads(line)
+
+    def write_to(self, fp, indent=4):
+        # indent=None 时输出紧凑格式，和 json.dump(separators=(',', ':')) 一致
+        if not self._groups:
+            fp.write("{}")
+            return
+        if indent is None:
+            item_sep, group_sep = ",", ","
+            fp.write("{")
+        else:
+            pad = " " * indent
+            item_sep, group_sep = ",\n", ",\n"
+            fp.write("{\n")
+        for gi, group in enumerate(self._groups):
+            if gi:
+                fp.write(group_sep)
+            key = json.dumps(group, ensure_ascii=False)
+            if not self._groups[group][1]:
+                fp.write(f"{key}:[]" if indent is None else f"{pad}{key}: []")
+                continue
+            fp.write(f"{key}:[" if indent is None else f"{pad}{key}: [\n")
+            for ei, entry in enumerate(self._iter_entries(group)):
+                if ei:
+                    fp.write(item_sep)
+                if indent is None:
+                    fp.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')))
+                else:
+                    text = json.dumps(entry, ensure_ascii=False, indent=indent)
+                    fp.write('\n'.join(pad * 2 + line for line in text.split('\n')))
+            fp.write("]" if indent is None else f"\n{pad}]")
+        fp.write("}" if indent is None else "\n}")
+
+    def write(self, out_path, indent=4):
+        # 原子写入，写到一半出错也不会留下截断的 JSON
+        with atomic_write(out_path) as fp:
+            self.write_to(fp, indent)
+
+    def close(self):
+        for fh, _ in self._groups.values():
+            fh.close()
+        self._groups = {}
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _JsonStreamReader:
+    """
+    增量读取 {"组名": [对象, ...], ...} 结构的 JSON，每次只解码一个条目。
+    不依赖具体缩进格式，旧的 indent=4 文件和紧凑格式都能读。
+    """
+    def __init__(self, fh, chunk_size=1 << 16):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.fh.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢掉已经消费的部分，避免缓冲区无限增长
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"JSON 格式错误: 期望 {ch!r}，实际 {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # 数字可能正好被缓冲区截断，结尾处再读一块确认
+                if end == len(self.buf) and not self.eof and not isinstance(obj, (dict, list, str)):
+                    raise json.JSONDecodeError("truncated", self.buf, end)
+                self.pos = end
+                return obj
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+def iter_grouped_json(path, include_empty=False):
+    """
+    逐条 yield (组名, 条目)，适用于 onews*.json 这种按组分列表的文件。
+    include_empty=True 时空组也会以 (组名, None) 的形式出现一次。
+    """
+    with open(path, 'r', encoding='utf-8') as fh:
+        reader = _JsonStreamReader(fh)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            group = reader.value()
+            reader.expect(':')
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.pos += 1
+                if include_empty:
+                    yield group, None
+            else:
+                while True:
+                    yield group, reader.value()
+                    if reader.peek() == ',':
+                        reader.pos += 1
+                        continue
+                    reader.expect(']')
+                    break
+            if reader.peek() == ',':
+                reader.pos += 1
+                continue
+            reader.expect('}')
+            return
+
+def entry_digest(item):
+    # 去重用的 128 位摘要，代替把 topic+url+article 全文放进集合
+    key = json.dumps([item.get("topic", ""), item.get("url", ""), item.get("article", "")],
+                     ensure_ascii=False)
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+# 翻译后的标题带有 "1、" 之类的序号前缀
+TOPIC_NUMBER_RE = re.compile(r'^[0-9０-９]+[、,，]\s*')
+
+def generate_news_json(news_directory, today, compact=False):
     """
     扫描 News_*.txt、TodayCNH_*.html、article_copier_{today}.txt，
-    生成分组的 JSON 并写入 news_<timestamp>.json。
+    生成分组的 JSON 并写入 news_<timestamp>.json。compact=True 时输出紧凑格式。
     """
     # 1. 解析 TodayCNH_*.html -> { norm_url: (site, topic, original_url) }
     #    **改动**: cnh_map 中增加存储原始 URL
     cnh_map = {}
     for html_path in glob.glob(os.path.join(news_directory, f"TodayCNH_*.html")):
-        with open(html_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        # 匹配 <tr>…<td>SITE</td>…<a href="URL">TITLE</a>
-        for site, url, title in re.findall(
-            r"<tr>.*?<td>\s*([^<]+)\s*</td>.*?<a\s+href=\"([^\"]+)\"[^>]*>([^<]+)</a>",
-            text, re.S):
-            original_url = url.strip()
+        # 流式解析表格，每行 <tr><td>SITE</td>…<a href="URL">TITLE</a>
+        for site, original_url, title in iter_news_table_rows(html_path):
             nu = normalize_url(original_url)
-            site = site.strip()
             # 这里把全/半角数字+逗号都去掉
-            topic = re.sub(r'^[0-9０-９]+[、,，]\s*', '', title.strip())
+            topic = TOPIC_NUMBER_RE.sub('', title)
             cnh_map[nu] = (site, topic, original_url) # 保存站点、主题和原始URL
 
     # 2. 解析 article_copier_{today}.txt -> { norm_url: [img1, img2, ...] }
@@ -772,56 +1842,202 @@ def generate_news_json(news_directory, today):
         for u, imgs in url_images_raw.items()
     }
 
-    # 3. 组装 data
-    data = {}
-    for txt_path in glob.glob(os.path.join(news_directory, "News_*.txt")):
-        with open(txt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        entries = []
-        current_url = None
-        buf = []
-
-        for line in content.splitlines():
-            raw = line.strip().lstrip('\ufeff')
-            if raw.startswith("http"):
-                # 碰到新 URL，先把上一个 append
-                if current_url is not None:
-                    entries.append((current_url, "\n".join(buf).strip()))
-                current_url = raw
-                buf = []
-            else:
-                if current_url and raw:
-                    buf.append(raw)
-        # 最后一条
-        if current_url is not None:
-            entries.append((current_url, "\n".join(buf).strip()))
-
-        # 每条 entry 去匹配 site/topic/images
-        for url, article_text in entries:
-            nu = normalize_url(url)
-            if nu not in cnh_map:
-                continue
-
-            site_code, topic, original_url_from_map = cnh_map[nu]
-            imgs = url_images.get(nu, [])
-
-            # 查表，取映射后的显示名称，默认回退到原 site_code
-            display_site = SITE_DISPLAY_MAP.get(site_code.lower(), site_code)
-
-            data.setdefault(display_site, []).append({
-                "topic":   topic,
-                "url":     original_url_from_map,
-                "article": article_text,
-                "images":  imgs
-            })
-
-    # 4. 写 JSON
+    # 3. 边解析边按组写入暂存文件，不在内存里拼整个 data
     out_path = os.path.join(news_directory, f"onews.json")
-    with open(out_path, 'w', encoding='utf-8') as fp:
-        json.dump(data, fp, ensure_ascii=False, indent=4)
+    with GroupedJsonSpool(news_directory) as spool:
+        for txt_path in glob.glob(os.path.join(news_directory, "News_*.txt")):
+            # PDF 阶段已经解析过的文件直接命中缓存
+            for article in load_articles(txt_path):
+                if not article.url:
+                    continue
+                nu = article.norm_url
+                if nu not in cnh_map:
+                    continue
+
+                site_code, topic, original_url_from_map = cnh_map[nu]
+                imgs = url_images.get(nu, [])
+
+                # 查站点表，取映射后的显示名称，默认回退到原 site_code
+                display_site = site_display_name(site_code)
+
+                spool.add(display_site, {
+                    "topic":   topic,
+                    "url":     original_url_from_map,
+                    "article": article.body,
+                    "images":  imgs
+                })
+
+        # 4. 写 JSON（一次原子写入）
+        spool.write(out_path, indent=None if compact else 4)
     print(f"\n已生成 JSON 文件: {out_path}")
 
-def backup_news_assets(local_dir):
+# ------  图片目录备份：硬链接 / reflink  ------#
+_FICLONE = 0x40049409  # Linux ioctl: 在 btrfs/xfs 等文件系统上做写时复制克隆
+_LIBC = None
+
+def _reflink(src, dst):
+    """
+    写时复制克隆单个文件：macOS(APFS) 用 clonefile，Linux 用 FICLONE。不支持时抛 OSError。
+    """
+    global _LIBC
+    if sys.platform == "darwin":
+        if _LIBC is None:
+            _LIBC = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if _LIBC.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), dst)
+        return
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+_LINK_METHODS = {
+    "reflink": _reflink,
+    "hardlink": os.link,
+    "copy": shutil.copy2,
+}
+# auto 模式按顺序尝试：克隆最安全（两边互不影响），硬链接次之，最后才真正复制字节
+_LINK_ORDER = {
+    "auto": ("reflink", "hardlink", "copy"),
+    "reflink": ("reflink", "copy"),
+    "hardlink": ("hardlink", "copy"),
+    "copy": ("copy",),
+}
+
+def link_tree(src_dir, dst_dir, mode="auto", workers=8):
+    """
+    把 src_dir 整个“复制”到 dst_dir（目标已存在时合并覆盖，同 copytree(dirs_exist_ok=True)）。
+    能用 reflink/硬链接时只做元数据操作，不再重写图片字节；都不行时退回线程池并行复制。
+    某种方式在这对目录之间失败一次（如跨设备、文件系统不支持）后，后续文件不再尝试它。
+    返回 {方式: 文件数}。
+    """
+    methods = list(_LINK_ORDER[mode])
+    tasks = []
+    for root, dirs, files in os.walk(src_dir):
+        target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            tasks.append((os.path.join(root, name), os.path.join(target_root, name)))
+
+    def place(task):
+        src, dst = task
+        if os.path.lexists(dst):
+            os.remove(dst)
+        for method in list(methods):
+            try:
+                _LINK_METHODS[method](src, dst)
+                return method
+            except OSError:
+                if method == "copy":
+                    raise
+                try:
+                    methods.remove(method)
+                except ValueError:
+                    pass  # 其他线程已经移除
+                if os.path.lexists(dst):
+                    os.remove(dst)
+        raise OSError(f"无法复制 {src}")
+
+    counts = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for method in executor.map(place, tasks):
+            counts[method] = counts.get(method, 0) + 1
+    return counts
+
+def verify_tree_copy(src_dir, dst_dir):
+    """
+    删除源目录前的安全检查：src_dir 下每个文件在 dst_dir 中都存在且大小一致。
+    """
+    for root, _, files in os.walk(src_dir):
+        target_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        for name in files:
+            src = os.path.join(root, name)
+            dst = os.path.join(target_root, name)
+            if not os.path.isfile(dst) or os.path.getsize(dst) != os.path.getsize(src):
+                print(f"校验失败: {dst} 缺失或大小不一致")
+                return False
+    return True
+
+def _describe_link_counts(counts):
+    names = {"reflink": "克隆", "hardlink": "硬链接", "copy": "复制"}
+    return "，".join(f"{names[m]} {n} 个" for m, n in counts.items()) or "0 个文件"
+
+# ------  内容寻址图片库  ------#
+# 所有图片按 MD5 存一份在 local_dir/.blobs 下，各天的 news_images_* 里只是指向它的硬链接。
+# 文件的硬链接数就是引用计数：某个 blob 的 st_nlink 降到 1，说明已没有任何目录在用它。
+# 因此 local_dir 之外不能再给这些文件建硬链接（备份只用 reflink 或复制），
+# blob 设为只读，避免原地修改某一天的图片时其他天共用的同一份内容也跟着变。
+BLOB_STORE_NAME = ".blobs"
+BLOB_MODE = 0o444
+
+def blob_path(local_dir, md5, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(local_dir, BLOB_STORE_NAME, md5[:2], md5 + ext)
+
+def intern_image_dir(local_dir, dir_name, md5_cache, workers=1):
+    """
+    把 local_dir/dir_name 中的图片收进 blob 库：
+    库里还没有的内容直接链接进去；已有相同内容的，用指向 blob 的硬链接替换当前文件，
+    重复图片因此不再额外占用空间。返回 (新收录数, 去重数)。
+    """
+    dir_path = os.path.join(local_dir, dir_name)
+    paths = []
+    for root, dirs, files in os.walk(dir_path):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        paths.extend(os.path.join(root, name) for name in files if not name.startswith('.'))
+    digests = md5_cache.digest_many(paths, workers=workers)
+
+    added = deduped = 0
+    for path in paths:
+        md5 = digests[path]
+        target = blob_path(local_dir, md5, path)
+        try:
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.link(path, target)
+                os.chmod(target, BLOB_MODE)
+                added += 1
+            elif not os.path.samefile(path, target):
+                # 原子替换：先在旁边建好链接再改名覆盖
+                tmp_path = path + ".bloblink"
+                os.link(target, tmp_path)
+                os.replace(tmp_path, path)
+                os.chmod(target, BLOB_MODE)
+                deduped += 1
+            else:
+                continue
+            # inode 可能变了，顺手更新 MD5 缓存，避免下次重新计算
+            st = os.stat(path)
+            md5_cache.store(path, [st.st_size, st.st_mtime_ns, st.st_ino], md5)
+        except OSError as e:
+            # 文件系统不支持硬链接等情况：保留原文件，只是不去重
+            print(f"收录图片到 blob 库失败，保留原文件: {path} ({e})")
+    return added, deduped
+
+def gc_blob_store(local_dir):
+    """
+    回收没有任何目录引用的 blob（硬链接数为 1），返回 (删除个数, 释放字节数)。
+    """
+    store = os.path.join(local_dir, BLOB_STORE_NAME)
+    removed = freed = 0
+    for root, _, files in os.walk(store):
+        for name in files:
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            if st.st_nlink <= 1:
+                os.remove(path)
+                removed += 1
+                freed += st.st_size
+    return removed, freed
+
+def backup_news_assets(local_dir, hash_workers=1, link_mode="auto", store=None):
+    # store: 共享的 JsonDocumentStore，version.json 的修改留给它统一写出；不传时在本函数内写出
     timestamp = datetime.now().strftime("%y%m%d")
     # 原始资源位置
     src_img_dir = "/Users/yanzhang/Downloads/news_images"
@@ -835,25 +2051,41 @@ def backup_news_assets(local_dir):
     backup_dir = "/Users/yanzhang/Downloads/backup"
     backup_file_dir = "/Users/yanzhang/Coding/News/done"
 
-    # 1) 合并图片目录
+    # 1) 合并图片目录（优先 reflink/硬链接，只有元数据操作）
     if os.path.exists(src_img_dir):
         os.makedirs(local_img_target, exist_ok=True)
-        # Python 3.8+ 支持 dirs_exist_ok
-        shutil.copytree(src_img_dir, local_img_target, dirs_exist_ok=True)
-        print(f"已将图片合并到: {local_img_target}")
+        counts = link_tree(src_img_dir, local_img_target, mode=link_mode)
+        print(f"已将图片合并到: {local_img_target}（{_describe_link_counts(counts)}）")
 
-        # 3) 删除原目录
-        shutil.rmtree(src_img_dir)
-        print(f"已删除原始图片目录: {src_img_dir}")
+        # 3) 校验通过后才删除原目录
+        if verify_tree_copy(src_img_dir, local_img_target):
+            shutil.rmtree(src_img_dir)
+            print(f"已删除原始图片目录: {src_img_dir}")
+        else:
+            print(f"警告: 合并结果校验失败，保留原始图片目录: {src_img_dir}")
+
+        # 收进内容寻址 blob 库，和前几天重复的图片只占一份空间
+        md5_cache = Md5Cache(local_dir)
+        added, deduped = intern_image_dir(local_dir, os.path.basename(local_img_target), md5_cache,
+                                          workers=hash_workers)
+        md5_cache.save()
+        print(f"blob 库: 新收录 {added} 张图片，去重 {deduped} 张")
     else:
         print(f"未找到源图片目录: {src_img_dir}")
 
     # 1) 备份到 Downloads/backup
     backup_img_target = os.path.join(backup_dir, f"news_images_{timestamp}")
-    if os.path.exists(backup_img_target):
-        shutil.rmtree(backup_img_target)
-    shutil.copytree(local_img_target, backup_img_target)
-    print(f"图片目录已备份到: {backup_img_target}")
+    if os.path.isdir(local_img_target):
+        if os.path.exists(backup_img_target):
+            shutil.rmtree(backup_img_target)
+        os.makedirs(backup_img_target)
+        # 本地图片已是 blob 的硬链接，备份再建硬链接会让 blob 的链接数永远大于 1、无法回收，
+        # 而且两边共用同一份内容；所以备份只用 reflink（写时复制）或直接复制
+        backup_mode = "copy" if link_mode == "copy" else "reflink"
+        counts = link_tree(local_img_target, backup_img_target, mode=backup_mode)
+        print(f"图片目录已备份到: {backup_img_target}（{_describe_link_counts(counts)}）")
+    else:
+        print(f"未找到本地图片目录，跳过备份: {local_img_target}")
 
     # 2) 合并 JSON 文件
     if os.path.exists(src_json):
@@ -862,7 +2094,7 @@ def backup_news_assets(local_dir):
         shutil.copy2(src_json, tmp_json)
         if os.path.exists(local_json_target):
             # 如果已有同名文件，则合并
-            merge_json_groupwise(local_json_target, tmp_json)
+            merge_json_groupwise(local_json_target, tmp_json, compact=bool(store and store.compact))
             os.remove(tmp_json)
         else:
             # 第一次备份，直接重命名
@@ -881,30 +2113,181 @@ def backup_news_assets(local_dir):
     print(f"JSON文件已备份到: {backup_file_target}")
 
     # 3) 更新 version.json（保持原有逻辑不变）
-    update_version_json(local_dir, timestamp)
+    update_version_json(local_dir, timestamp, hash_workers=hash_workers, store=store)
+
+
+# ------  图片目录清单  ------#
+def image_manifest_name(dir_name):
+    return f"{dir_name}.manifest.json"
 
+def merkle_root(leaves):
+    """
+    由叶子哈希（bytes）两两合并得到根哈希，奇数个时最后一个直接上移。
+    叶子和内部节点加不同前缀，防止两种节点互相伪造。
+    """
+    level = list(leaves)
+    if not level:
+        return hashlib.sha256(b"").hexdigest()
+    while len(level) > 1:
+        nxt = []
+        for i in range(0, len(level) - 1, 2):
+            nxt.append(hashlib.sha256(b"\x01" + level[i] + level[i + 1]).digest())
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0].hex()
+
+def image_dir_signature(dir_path):
+    """
+    图片目录的变化签名：目录及各级子目录的 mtime_ns，不 stat 目录里的文件。
+    增删、改名、用链接替换图片都会改变所在目录的 mtime；收进 blob 库的图片是只读的，不会被原地改写。
+    """
+    sig = []
+    for root, dirs, _ in os.walk(dir_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        sig.append([os.path.relpath(root, dir_path).replace(os.sep, '/'), os.stat(root).st_mtime_ns])
+    return sig
+
+def load_image_manifest(local_dir, dir_name):
+    manifest_path = os.path.join(local_dir, image_manifest_name(dir_name))
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
 
-def update_version_json(local_dir, timestamp):
+def write_image_manifest(local_dir, dir_name, md5_cache, workers=1):
+    """
+    为 local_dir/dir_name 生成清单 {name, root, files: [{name, size, md5}], sig}，
+    写到目录旁边的 <dir_name>.manifest.json（不放进目录里，免得被当成图片下载）。
+    已有清单的 sig（image_dir_signature）和目录当前一致时直接返回旧清单，不遍历文件也不重写；
+    否则重新生成，每个文件的 MD5 走 Md5Cache，只有新增或变化的图片才会被读取，内容没变时不重写清单文件。
+    """
+    dir_path = os.path.join(local_dir, dir_name)
+    sig = image_dir_signature(dir_path)
+    existing = load_image_manifest(local_dir, dir_name)
+    if existing is not None and existing.get("sig") == sig and existing.get("name") == dir_name:
+        return existing
+
+    paths = []
+    for root, dirs, files in os.walk(dir_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if not name.startswith('.'):
+                paths.append(os.path.join(root, name))
+    digests = md5_cache.digest_many(paths, workers=workers)
+
+    entries = []
+    leaves = []
+    for path in paths:
+        rel = os.path.relpath(path, dir_path).replace(os.sep, '/')
+        size = os.path.getsize(path)
+        md5 = digests[path]
+        entries.append({"name": rel, "size": size, "md5": md5})
+        leaves.append(hashlib.sha256(b"\x00" + f"{rel}\0{size}\0{md5}".encode('utf-8')).digest())
+
+    manifest = {"name": dir_name, "root": merkle_root(leaves), "files": entries, "sig": sig}
+    if manifest != existing:
+        with atomic_write(os.path.join(local_dir, image_manifest_name(dir_name))) as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+    return manifest
+
+# version.json 的日期索引：条目按文件名中的 YYMMDD 排序，清理时二分找到过期的前缀，不必扫描整个 version.json
+VERSION_INDEX_NAME = ".version_index.json"
+ASSET_DATE_PATTERN = re.compile(r'_(\d{6})')
+
+def build_version_index(version_path, data):
+    """
+    由 version.json 的内容生成日期索引，并记下 version.json 当前的大小和 mtime 用于判断是否过期。
+    文件名不含合法日期的条目放进 undated，清理时一律保留。
+    version_path 为 None 表示数据还没写盘（JsonDocumentStore 里待写的修改），只生成条目不记 stat。
+    """
+    dated, undated = [], []
+    for item in data.get("files", []):
+        item_name = item.get("name", "")
+        match = ASSET_DATE_PATTERN.search(item_name)
+        try:
+            datetime.strptime(match.group(1), "%y%m%d")
+        except (AttributeError, ValueError):
+            undated.append(item_name)
+            continue
+        dated.append([match.group(1), item_name, item.get("type")])
+    dated.sort()
+    if version_path is None:
+        return {"dated": dated, "undated": undated}
+    st = os.stat(version_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "dated": dated, "undated": undated}
+
+def save_version_index(local_dir, data):
+    version_path = os.path.join(local_dir, "version.json")
+    index_path = os.path.join(local_dir, VERSION_INDEX_NAME)
+    with atomic_write(index_path) as f:
+        json.dump(build_version_index(version_path, data), f, ensure_ascii=False, separators=(',', ':'))
+
+def load_version_index(local_dir, store=None):
+    """
+    读取日期索引；索引缺失、损坏，或 version.json 在索引之后被别的程序改过时，读一遍 version.json 重建。
+    store 里有尚未写出的 version.json 修改时，直接由内存中的数据生成。
+    """
+    version_path = os.path.join(local_dir, "version.json")
+    index_path = os.path.join(local_dir, VERSION_INDEX_NAME)
+    if store is not None and store.is_dirty(version_path):
+        return build_version_index(None, store.load(version_path))
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        st = os.stat(version_path)
+        if index.get("size") == st.st_size and index.get("mtime_ns") == st.st_mtime_ns:
+            return index
+    except (OSError, json.JSONDecodeError):
+        pass
+    print("version.json 日期索引缺失或已过期，重新生成。")
+    if store is not None:
+        data = store.load(version_path)
+    else:
+        with open(version_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    for item_name in build_version_index(version_path, data)["undated"]:
+        print(f"警告: '{item_name}' 不含标准日期戳，将予以保留。")
+    save_version_index(local_dir, data)
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def update_version_json(local_dir, timestamp, hash_workers=1, store=None):
     """
     读取 local_dir/version.json，向 files 数组追加本次
     onews_*.json 和 news_images_* 记录，并为 json 文件计算 MD5，
-    最后写回 version.json。
+    为图片目录生成清单和根哈希（root / manifest 字段），最后写回 version.json。
+    MD5 通过 Md5Cache 增量计算，未变化的文件不再重新读取；hash_workers > 1 时并行计算。
+    传入 store 时修改只记在 JsonDocumentStore 里，由调用方统一写出；否则在这里原子写入。
     """
     version_path = os.path.join(local_dir, "version.json")
+    md5_cache = Md5Cache(local_dir)
+    own_store = store is None
+    if own_store:
+        store = JsonDocumentStore()
     
     # 如果 version.json 不存在，则初始化一个空结构
-    if not os.path.exists(version_path):
-        data = {"version": "1.0", "files": []}
-    else:
-        with open(version_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+    data = store.load(version_path, default={"version": "1.0", "files": []})
     
     # 2) 先遍历已有条目，如果是 json，就重新计算 MD5 并更新
+    json_name = f"onews_{timestamp}.json"
+    json_path = os.path.join(local_dir, json_name)
+    json_paths = [
+        os.path.join(local_dir, item["name"])
+        for item in data.get("files", [])
+        if item.get("type") == "json" and os.path.isfile(os.path.join(local_dir, item["name"]))
+    ]
+    if os.path.isfile(json_path):
+        json_paths.append(json_path)
+    digests = md5_cache.digest_many(json_paths, workers=hash_workers)
+    
     for item in data.get("files", []):
         if item.get("type") == "json":
             file_path = os.path.join(local_dir, item["name"])
-            if os.path.isfile(file_path):
-                new_md5 = compute_md5(file_path)
+            if file_path in digests:
+                new_md5 = digests[file_path]
                 if item.get("md5") != new_md5:
                     print(f"更新 MD5: {item['name']} {item.get('md5','')} -> {new_md5}")
                     item["md5"] = new_md5
@@ -912,15 +2295,13 @@ def update_version_json(local_dir, timestamp):
     # 3) 准备本次要追加的条目
     to_add = []
     # JSON 文件
-    json_name = f"onews_{timestamp}.json"
-    json_path = os.path.join(local_dir, json_name)
     if os.path.isfile(json_path):
         to_add.append({
             "name": json_name,
             "type": "json",
-            "md5": compute_md5(json_path)
+            "md5": digests[json_path]
         })
-    # 图片目录（这里我们不算 MD5，只用时间戳判断更新）
+    # 图片目录（不算整体 MD5，root 和 manifest 在下面第 5 步统一生成）
     img_name = f"news_images_{timestamp}"
     to_add.append({
         "name": img_name,
@@ -940,134 +2321,471 @@ def update_version_json(local_dir, timestamp):
             else:
                 print(f"跳过添加 (已存在): {e['name']}")
     
-    # 写回 version.json（格式化，保留缩进）
-    with open(version_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-        print(f"version.json 已更新: {version_path}")
+    # 5) 为每个图片目录刷新清单和根哈希，客户端据此只下载变化的图片；目录没变的直接沿用旧清单
+    for item in data["files"]:
+        if item.get("type") == "images" and os.path.isdir(os.path.join(local_dir, item["name"])):
+            manifest = write_image_manifest(local_dir, item["name"], md5_cache, workers=hash_workers)
+            if item.get("root") != manifest["root"]:
+                print(f"图片目录根哈希: {item['name']} -> {manifest['root'][:12]}… ({len(manifest['files'])} 个文件)")
+            item["root"] = manifest["root"]
+            item["manifest"] = image_manifest_name(item["name"])
+    
+    # 写回 version.json；落盘后顺手刷新日期索引，下次清理不用再读 version.json
+    store.mark_dirty(version_path, after_flush=lambda d: save_version_index(local_dir, d))
+    if own_store:
+        store.flush()
+    print(f"version.json 已更新: {version_path}")
+    
+    md5_cache.forget_missing()
+    md5_cache.save()
+
+def delete_expired_asset(local_dir, item_name, item_type):
+    """
+    删除一个过期的资产及其附属文件（去重索引 / 图片目录清单），返回 (是否删除, 日志行列表)。
+    在线程池里执行，日志交给调用方统一打印，避免多个线程的输出交错。
+    """
+    path_to_delete = os.path.join(local_dir, item_name)
+    logs = []
+    deleted = False
+    try:
+        if item_type == "json" and os.path.isfile(path_to_delete):
+            os.remove(path_to_delete)
+            logs.append(f"  - 已删除文件: {path_to_delete}")
+            deleted = True
+            # 连同去重索引一起删除
+            if os.path.exists(dedup_index_path(path_to_delete)):
+                os.remove(dedup_index_path(path_to_delete))
+        elif item_type == "images" and os.path.isdir(path_to_delete):
+            shutil.rmtree(path_to_delete)
+            logs.append(f"  - 已删除目录: {path_to_delete}")
+            deleted = True
+            # 连同目录清单一起删除
+            manifest_path = os.path.join(local_dir, image_manifest_name(item_name))
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+        elif not os.path.exists(path_to_delete):
+            logs.append(f"  - 警告: 资产已不存在于磁盘，仅从 version.json 中移除。")
+        else:
+            logs.append(f"  - 警告: 类型未知或路径类型不匹配，跳过删除磁盘文件。")
+    except OSError as e:
+        logs.append(f"  - 错误: 删除 '{path_to_delete}' 时失败: {e}")
+    return deleted, logs
 
 # --- 新增功能：清理旧的资产 ---
-def prune_old_assets(local_dir, days_to_keep):
+def prune_old_assets(local_dir, days_to_keep, workers=8, store=None, now=None):
     """
     清理 version.json 和本地目录中超过指定天数的旧文件和目录。
+    过期条目从日期索引里二分查出，没有过期资产时连 version.json 都不读；
+    过期的文件和目录用 workers 个线程并行删除。
 
     Args:
         local_dir (str): 资产所在的目录 (例如 /Users/yanzhang/Coding/LocalServer/Resources/ONews)。
         days_to_keep (int): 文件和目录保留的天数。
+        workers (int): 并行删除的线程数。
+        store (JsonDocumentStore): 共享的文档缓存，传入时 version.json 由调用方统一写出。
+        now (datetime): 计算截止日期用的当前时间，默认 datetime.now()。
     """
     version_path = os.path.join(local_dir, "version.json")
-    if not os.path.exists(version_path):
+    if not os.path.exists(version_path) and not (store is not None and store.is_dirty(version_path)):
         print(f"未找到 version.json，跳过清理。")
         return
 
     print(f"\n开始清理超过 {days_to_keep} 天的旧资产...")
 
     try:
-        with open(version_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError) as e:
+        index = load_version_index(local_dir, store)
+    except (json.JSONDecodeError, OSError) as e:
         print(f"读取 version.json 时出错: {e}。无法进行清理。")
         return
 
     # 计算截止日期
-    cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-    
-    files_to_keep = []
+    cutoff_date = (now or datetime.now()) - timedelta(days=days_to_keep)
+    # 资产日期按当天 0 点计：截止时刻不在 0 点时，截止当天的资产也已过期
+    cutoff_key = cutoff_date.strftime("%y%m%d")
+    dated = index["dated"]
+    keys = [entry[0] for entry in dated]
+    if cutoff_date.time() == datetime.min.time():
+        expired_count = bisect.bisect_left(keys, cutoff_key)
+    else:
+        expired_count = bisect.bisect_right(keys, cutoff_key)
+    expired = dated[:expired_count]
+
+    if not expired:
+        print("\n没有找到需要清理的过期资产。")
+        return
+
     files_deleted_count = 0
-    
-    # 正则表达式用于从文件名中提取 YYMMDD 日期
-    date_pattern = re.compile(r'_(\d{6})')
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(expired)))) as executor:
+        results = executor.map(lambda entry: delete_expired_asset(local_dir, entry[1], entry[2]), expired)
+        for (date_str, item_name, _), (deleted, logs) in zip(expired, results):
+            file_date = datetime.strptime(date_str, "%y%m%d")
+            print(f"发现过期资产: {item_name} (日期: {file_date.strftime('%Y-%m-%d')})")
+            for line in logs:
+                print(line)
+            files_deleted_count += deleted
+
+    # 目录删掉后，blob 的硬链接数随之减少；回收已经没有引用的 blob
+    if os.path.isdir(os.path.join(local_dir, BLOB_STORE_NAME)):
+        removed, freed = gc_blob_store(local_dir)
+        if removed:
+            print(f"已回收 {removed} 个无引用的图片 blob，释放 {freed / 1024 / 1024:.1f} MB")
+
+    # 有过期条目时才改写 version.json
+    expired_names = {entry[1] for entry in expired}
+    own_store = store is None
+    if own_store:
+        store = JsonDocumentStore()
+    try:
+        data = store.load(version_path)
+        data["files"] = [item for item in data.get("files", []) if item.get("name", "") not in expired_names]
+        store.mark_dirty(version_path, after_flush=lambda d: save_version_index(local_dir, d))
+        if own_store:
+            store.flush()
+        print(f"\nversion.json 已更新，移除了 {len(expired_names)} 个过期的条目（删除 {files_deleted_count} 个）。")
+    except (IOError, json.JSONDecodeError) as e:
+        print(f"错误: 无法写回更新后的 version.json: {e}")
+
+# 每个 onews_*.json 旁边的去重索引：记录文件中每个条目的 128 位摘要
+DEDUP_INDEX_SUFFIX = ".idx"
+
+def dedup_index_path(json_path):
+    return json_path + DEDUP_INDEX_SUFFIX
+
+def load_dedup_index(json_path):
+    """
+    读取 json_path 的去重索引，返回 {组名: {摘要, ...}}。
+    索引不存在、损坏，或记录的大小/mtime 和当前文件对不上时返回 None。
+    """
+    try:
+        with open(dedup_index_path(json_path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        st = os.stat(json_path)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if index.get("size") != st.st_size or index.get("mtime_ns") != st.st_mtime_ns:
+        return None
+    return {group: {bytes.fromhex(d) for d in digests}
+            for group, digests in index.get("groups", {}).items()}
+
+def save_dedup_index(json_path, seen):
+    st = os.stat(json_path)
+    index = {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "groups": {group: sorted(d.hex() for d in digests) for group, digests in seen.items()},
+    }
+    with atomic_write(dedup_index_path(json_path)) as f:
+        json.dump(index, f, separators=(',', ':'))
 
-    for item in data.get("files", []):
-        item_name = item.get("name", "")
-        match = date_pattern.search(item_name)
-        
-        if not match:
-            # 如果文件名不符合 'name_YYMMDD' 格式，默认保留
-            print(f"警告: '{item_name}' 不含标准日期戳，将予以保留。")
-            files_to_keep.append(item)
-            continue
-            
-        date_str = match.group(1)
+def merge_json_groupwise(existing_path, new_path, compact=False):
+    """
+    将 new_path 中的 JSON 内容按 top-level key（组名）合并到 existing_path。
+    去重逻辑：如果同一组下出现完全相同的条目（topic+url+article），只保留一份。
+    两个文件都是逐条流式读取，去重集合里只存 128 位摘要，内存不随存档大小增长。
+    existing_path 旁有有效的去重索引时，旧条目直接照抄，只对新条目计算摘要。
+    """
+    seen = load_dedup_index(existing_path)
+    index_valid = seen is not None
+    if not index_valid:
+        seen = {}
+        print(f"去重索引缺失或已过期，重新扫描: {existing_path}")
+
+    with GroupedJsonSpool(os.path.dirname(existing_path) or None) as spool:
+        # 旧文件的组在前，新文件独有的组追加在后，和原来 {**old, **new} 的顺序一致
+        for path in (existing_path, new_path):
+            trusted = index_valid and path == existing_path
+            for group, item in iter_grouped_json(path, include_empty=True):
+                if item is None:
+                    spool.touch(group)
+                    continue
+                if trusted:
+                    # 索引是上次合并去重后写的，旧条目本身不会重复
+                    spool.add(group, item)
+                    continue
+                digest = entry_digest(item)
+                group_seen = seen.setdefault(group, set())
+                if digest not in group_seen:
+                    group_seen.add(digest)
+                    spool.add(group, item)
+
+        # 写回 existing_path（一次原子写入）
+        spool.write(existing_path, indent=None if compact else 4)
+    save_dedup_index(existing_path, seen)
+    print(f"合并并更新 JSON: {existing_path}")
+
+# ------  可恢复的流水线  ------#
+PIPELINE_JOURNAL_NAME = ".txt2json_journal.json"
+
+# name: 阶段名；func: 无参可调用，返回 False 视为失败；
+# inputs / outputs: 无参可调用，返回该阶段读取 / 产出的文件路径列表（目录会展开成其中的文件）；
+# key: 可选的无参可调用，返回结果还依赖的非文件输入（如当天日期），和上次记录的不同就不跳过
+Stage = namedtuple('Stage', ['name', 'func', 'inputs', 'outputs', 'key'], defaults=(None,))
+
+def _expand_paths(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+def _path_signatures(paths):
+    sigs = {}
+    for path in _expand_paths(paths):
         try:
-            file_date = datetime.strptime(date_str, "%y%m%d")
-        except ValueError:
-            # 日期格式错误，保留并警告
-            print(f"警告: '{item_name}' 中的日期 '{date_str}' 格式错误，将予以保留。")
-            files_to_keep.append(item)
+            st = os.stat(path)
+        except OSError:
             continue
+        sigs[path] = [st.st_size, st.st_mtime_ns]
+    return sigs
 
-        if file_date < cutoff_date:
-            # 此文件/目录已过期，需要删除
-            print(f"发现过期资产: {item_name} (日期: {file_date.strftime('%Y-%m-%d')})")
-            path_to_delete = os.path.join(local_dir, item_name)
-            
+RUN_REPORT_NAME = "txt2json_runs.jsonl"
+PROFILE_DIR_NAME = ".txt2json_profiles"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif')
+
+class RunRecorder:
+    """
+    流水线运行报告：每个阶段、每个转换的文件各追加一行 JSON 到 report_path，跨天对比即可发现性能回退。
+    记录 wall / cpu 秒数、读写字节数（按阶段声明的输入 / 输出文件大小统计）和图片数。
+    profile_dir 不为空时，每个阶段再用 cProfile 导出一份 <run>_<序号>.prof，
+    用 python -m pstats 查看；进程池里子进程的渲染不在采样范围内，看 file 记录即可。
+    """
+    def __init__(self, report_path, profile_dir=None):
+        self.report_path = report_path
+        self.profile_dir = profile_dir
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def emit(self, kind, **fields):
+        record = {"run": self.run_id, "kind": kind, "time": datetime.now().isoformat(timespec='seconds')}
+        record.update(fields)
+        try:
+            with open(self.report_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入运行报告失败: {e}")
+
+    @staticmethod
+    def cpu_time():
+        # 本进程加上已回收子进程的 CPU 时间；进程池的 worker 在 executor 关闭时回收，会算进所在阶段
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return time.process_time() + children.ru_utime + children.ru_stime
+
+    def run_stage(self, index, stage):
+        """执行 stage.func 并记录一条 stage 报告；返回值和异常都原样交给调用方。"""
+        inputs_before = _path_signatures(stage.inputs())
+        outputs_before = _path_signatures(stage.outputs())
+        profiler = cProfile.Profile() if self.profile_dir else None
+        status = "failed"
+        wall_start, cpu_start = time.perf_counter(), self.cpu_time()
+        try:
+            result = profiler.runcall(stage.func) if profiler else stage.func()
+            if result is not False:
+                status = "done"
+            return result
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = self.cpu_time() - cpu_start
+            outputs_after = _path_signatures(stage.outputs())
+            if profiler:
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{self.run_id}_{index}.prof"))
+            self.emit("stage", stage=stage.name, index=index, status=status,
+                      wall=round(wall, 4), cpu=round(cpu, 4),
+                      bytes_read=sum(sig[0] for sig in inputs_before.values()),
+                      bytes_written=sum(sig[0] for path, sig in outputs_after.items()
+                                        if outputs_before.get(path) != sig),
+                      files_in=len(inputs_before),
+                      images_in=sum(1 for path in inputs_before
+                                    if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS))
+
+class PipelineRunner:
+    """
+    按顺序执行各阶段，并把每个阶段的输入 / 输出签名 (size, mtime_ns) 记到 journal 文件里。
+    再次运行时，已完成的阶段满足下面三点就跳过：
+      1. 当前输入里没有新增或变化的文件（被后续阶段移走的输入不算变化）；
+      2. 记录的输出仍然有效：文件未变，或者已被后面某个完成的阶段作为输入接手（如被移动、合并）；
+      3. 阶段声明了 key 时，key 的值和上次完成时相同。
+    任一阶段失败（返回 False 或抛异常）就停止，下次从该阶段继续。
+    传入 recorder 时各阶段的耗时和 I/O 写入运行报告，最后再写一条整次运行的汇总。
+    传入 store (JsonDocumentStore) 时，阶段对 JSON 文档的修改先留在内存里：
+    后面还有阶段要读的文档暂不写盘，等最后一个读它的阶段结束（或整次运行结束）时才写一次。
+    """
+    def __init__(self, journal_path, stages, recorder=None, store=None):
+        self.journal_path = journal_path
+        self.stages = stages
+        self.recorder = recorder
+        self.store = store
+        try:
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                self.journal = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.journal = {}
+        self.journal.setdefault("stages", {})
+
+    def _save(self):
+        with atomic_write(self.journal_path) as f:
+            json.dump(self.journal, f, ensure_ascii=False, indent=4)
+
+    def _consumed_later(self, index, path):
+        for later in self.stages[index + 1:]:
+            record = self.journal["stages"].get(later.name, {})
+            if record.get("status") == "done" and path in record.get("consumed", []):
+                return True
+        return False
+
+    def _can_skip(self, index, stage):
+        record = self.journal["stages"].get(stage.name)
+        if not record or record.get("status") != "done":
+            return False
+        if stage.key is not None and record.get("key") != stage.key():
+            return False
+        # 前面阶段改过、还没写盘的文档也算输入变化
+        if self.store is not None and any(self.store.is_dirty(path) for path in stage.inputs()):
+            return False
+        recorded_inputs = record.get("inputs", {})
+        for path, sig in _path_signatures(stage.inputs()).items():
+            if recorded_inputs.get(path) != sig:
+                return False
+        current_outputs = _path_signatures(list(record.get("outputs", {})))
+        for path, sig in record.get("outputs", {}).items():
+            if current_outputs.get(path) != sig and not self._consumed_later(index, path):
+                return False
+        return True
+
+    def run(self):
+        wall_start, cpu_start = time.perf_counter(), RunRecorder.cpu_time()
+        ok = False
+        try:
+            ok = self._run_stages()
+            return ok
+        finally:
+            # 失败时也把已完成阶段的修改写出去
+            if self.store is not None:
+                self.store.flush()
+            if self.recorder is not None:
+                self.recorder.emit("run", status="done" if ok else "failed",
+                                   wall=round(time.perf_counter() - wall_start, 4),
+                                   cpu=round(RunRecorder.cpu_time() - cpu_start, 4))
+
+    def _run_stages(self):
+        for index, stage in enumerate(self.stages, 1):
+            title = f"{index}. {stage.name}"
+            if self._can_skip(index - 1, stage):
+                print(f"\n{'=' * 10} {title}: 输入未变化且输出仍有效，跳过 {'=' * 10}")
+                if self.recorder is not None:
+                    self.recorder.emit("stage", stage=stage.name, index=index, status="skipped")
+                continue
+
+            print(f"\n{'=' * 10} {title}: 开始 {'=' * 10}")
+            consumed = sorted(_path_signatures(stage.inputs()))
+            record = {"status": "running", "started": datetime.now().isoformat(timespec='seconds')}
+            self.journal["stages"][stage.name] = record
+            self._save()
             try:
-                if item.get("type") == "json" and os.path.isfile(path_to_delete):
-                    os.remove(path_to_delete)
-                    print(f"  - 已删除文件: {path_to_delete}")
-                    files_deleted_count += 1
-                elif item.get("type") == "images" and os.path.isdir(path_to_delete):
-                    shutil.rmtree(path_to_delete)
-                    print(f"  - 已删除目录: {path_to_delete}")
-                    files_deleted_count += 1
-                elif not os.path.exists(path_to_delete):
-                    print(f"  - 警告: 资产已不存在于磁盘，仅从 version.json 中移除。")
+                if self.recorder is not None:
+                    ok = self.recorder.run_stage(index, stage) is not False
                 else:
-                    print(f"  - 警告: 类型未知或路径类型不匹配，跳过删除磁盘文件。")
+                    ok = stage.func() is not False
+            except Exception as e:
+                traceback.print_exc()
+                print(f"阶段 {stage.name} 出现异常: {e}")
+                ok = False
+
+            if not ok:
+                record["status"] = "failed"
+                self._save()
+                print(f"\n错误：阶段 {title} 失败，已终止后续所有任务。")
+                print("请检查上面的日志以确定失败原因；修复后重新运行会从该阶段继续。")
+                return False
+
+            if self.store is not None:
+                later_inputs = [path for later in self.stages[index:] for path in later.inputs()]
+                self.store.flush(exclude=later_inputs)
+
+            # 输入记录的是阶段结束后的状态，这样被本阶段改写的文件下次不会被误判为变化
+            record.update({
+                "status": "done",
+                "finished": datetime.now().isoformat(timespec='seconds'),
+                "consumed": consumed,
+                "inputs": _path_signatures(stage.inputs()),
+                "outputs": _path_signatures(stage.outputs()),
+            })
+            if stage.key is not None:
+                record["key"] = stage.key()
+            self._save()
+            print(f"{'=' * 10} 完成 {title} {'=' * 10}")
+        return True
 
+def clean_downloads_html(downloads_path):
+    html_files = [f for f in os.listdir(downloads_path) if f.endswith('.html')]
+    if html_files:
+        for file in html_files:
+            file_path = os.path.join(downloads_path, file)
+            try:
+                os.remove(file_path)
+                print(f'成功删除 HTML 文件: {file}')
             except OSError as e:
-                print(f"  - 错误: 删除 '{path_to_delete}' 时失败: {e}")
-        else:
-            # 文件/目录未过期，保留
-            files_to_keep.append(item)
-
-    if files_deleted_count > 0 or len(files_to_keep) != len(data.get("files", [])):
-        # 如果有任何变动，则更新 version.json
-        data["files"] = files_to_keep
-        try:
-            with open(version_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-            print(f"\nversion.json 已更新，移除了过期的条目。")
-        except IOError as e:
-            print(f"错误: 无法写回更新后的 version.json: {e}")
+                print(f'删除 HTML 文件失败 {file}: {e}')
     else:
-        print("\n没有找到需要清理的过期资产。")
+        print("Downloads 目录下没有找到 .html 文件。")
+
+# 本地服务器上资产（onews_*.json、news_images_*）保留的天数
+ASSET_DAYS_TO_KEEP = 4
 
-def merge_json_groupwise(existing_path, new_path):
+def build_news_pipeline(news_directory, article_copier_path, image_dir, downloads_path,
+                        local_server_dir, today, pdf_workers=1, recorder=None, part_budget=None,
+                        store=None, formats=("pdf",)):
     """
-    将 new_path 中的 JSON 内容按 top-level key（组名）合并到 existing_path。
-    去重逻辑：如果同一组下出现完全相同的条目（topic+url+article），只保留一份。
+    txt2json 的 8 个阶段，每个阶段声明自己读写哪些文件，供 PipelineRunner 判断能否跳过。
+    recorder 会传给 PDF 阶段，用于逐文件记录渲染耗时；part_budget 控制 PDF 分卷；
+    store 是和 PipelineRunner 共用的 JsonDocumentStore，备份和清理两个阶段对 version.json 的修改合并成一次写入；
+    formats 为第一阶段要生成的格式（pdf / epub），同一个 txt 只解析一次。
     """
-    def load(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    data_old = load(existing_path)
-    data_new = load(new_path)
-    merged = {}
-
-    for group, lst in {**data_old, **data_new}.items():
-        # 合并两个 dict 下同名 group 的列表
-        a = data_old.get(group, [])
-        b = data_new.get(group, [])
-        combined = a + b
-        # 去重：根据 topic + url + article 字段去重
-        seen = set()
-        deduped = []
-        for item in combined:
-            key = (
-                item.get("topic",""),
-                item.get("url",""),
-                item.get("article","")
-            )
-            if key not in seen:
-                seen.add(key)
-                deduped.append(item)
-        merged[group] = deduped
-
-    # 写回 existing_path
-    with open(existing_path, 'w', encoding='utf-8') as f:
-        json.dump(merged, f, ensure_ascii=False, indent=4)
-    print(f"合并并更新 JSON: {existing_path}")
+    onews_path = os.path.join(news_directory, "onews.json")
+    version_path = os.path.join(local_server_dir, "version.json")
+
+    def news_txts():
+        return find_all_news_files(news_directory)
+
+    def cnh_files():
+        return glob.glob(os.path.join(news_directory, "TodayCNH_*.html"))
+
+    def copier_files():
+        return glob.glob(os.path.join(news_directory, "article_copier_*.txt"))
+
+    def convert_pdfs():
+        # 没有 txt 时 process_all_files 返回 None，和原来一样视为失败
+        return bool(process_all_files(news_directory, article_copier_path, image_dir, workers=pdf_workers,
+                                      recorder=recorder, part_budget=part_budget, formats=formats))
+
+    return [
+        Stage("TXT 转 PDF", convert_pdfs,
+              lambda: news_txts() + [article_copier_path, image_dir],
+              lambda: [p for t in news_txts() for fmt in formats
+                       for p in list_render_outputs(get_output_path(t, fmt))]),
+        Stage("生成 JSON 汇总",
+              lambda: generate_news_json(news_directory, today, compact=bool(store and store.compact)),
+              lambda: news_txts() + cnh_files() + copier_files(),
+              lambda: [onews_path]),
+        Stage("移动 TodayCNH 文件", lambda: move_cnh_file(news_directory) or None,
+              cnh_files, lambda: []),
+        Stage("清理 Downloads 中的 HTML 文件", lambda: clean_downloads_html(downloads_path),
+              lambda: glob.glob(os.path.join(downloads_path, "*.html")), lambda: []),
+        Stage("移动 article_copier 文件", lambda: move_article_copier_files(news_directory, news_directory),
+              copier_files, lambda: []),
+        Stage("移动已处理的 TXT 文件", lambda: move_processed_txt_files(news_directory),
+              news_txts, lambda: []),
+        Stage("备份核心资产", lambda: backup_news_assets(local_server_dir, hash_workers=pdf_workers, store=store),
+              lambda: [image_dir, onews_path],
+              lambda: [os.path.join(local_server_dir, f"onews_{today}.json"), version_path]),
+        # 过期与否取决于运行当天的日期：version.json 没变的日子也要按新的日期重新清理
+        Stage("清理旧资产", lambda: prune_old_assets(local_server_dir, days_to_keep=ASSET_DAYS_TO_KEEP, store=store),
+              lambda: [version_path], lambda: [version_path],
+              lambda: [datetime.now().strftime("%y%m%d"), ASSET_DAYS_TO_KEEP]),
+    ]
 
 if __name__ == "__main__":
     today = datetime.now().strftime("%y%m%d")
@@ -1077,62 +2795,24 @@ if __name__ == "__main__":
     downloads_path = '/Users/yanzhang/Downloads'
     # 定义本地服务器资源目录，方便复用
     local_server_dir = "/Users/yanzhang/Coding/LocalServer/Resources/ONews"
-
-    # 1. 主要处理流程：TXT 转 PDF
-    print("="*10 + " 1. 开始 TXT 转 PDF 处理 " + "="*10)
-    # <--- 修改部分：捕获返回值 ---
-    pdf_conversion_successful = process_all_files(news_directory, article_copier_path, image_dir)
-    print("="*10 + " 完成 TXT 转 PDF 处理 " + "="*10)
-    
-    # <--- 修改部分：根据第一步的结果决定是否继续 ---
-    if pdf_conversion_successful:
-        print("\nPDF转换成功，继续执行后续步骤...")
-
-        # 2. 生成 JSON 汇总
-        print("\n" + "="*10 + " 2. 开始生成 JSON 汇总 " + "="*10)
-        generate_news_json(news_directory, today)
-        print("="*10 + " 完成生成 JSON 汇总 " + "="*10)
-
-        # 3. 移动 TodayCNH 文件 (如果需要)
-        print("\n" + "="*10 + " 3. 开始移动 TodayCNH 文件 " + "="*10)
-        move_cnh_file(news_directory)
-        print("="*10 + " 完成移动 TodayCNH 文件 " + "="*10)
-
-        # 4. 清理 Downloads 目录下的 .html 文件
-        print("\n" + "="*10 + " 4. 开始清理 Downloads 中的 HTML 文件 " + "="*10)
-        html_files = [f for f in os.listdir(downloads_path) if f.endswith('.html')]
-        if html_files:
-            for file in html_files:
-                file_path = os.path.join(downloads_path, file)
-                try:
-                    os.remove(file_path)
-                    print(f'成功删除 HTML 文件: {file}')
-                except OSError as e:
-                    print(f'删除 HTML 文件失败 {file}: {e}')
-        else:
-            print("Downloads 目录下没有找到 .html 文件。")
-        print("="*10 + " 完成清理 Downloads 中的 HTML 文件 " + "="*10)
-
-        # 5. 移动 article_copier 文件到 backup
-        print("\n" + "="*10 + " 5. 开始移动 article_copier 文件 " + "="*10)
-        move_article_copier_files(news_directory, news_directory)
-        print("="*10 + " 完成移动 article_copier 文件 " + "="*10)
-
-        # 6. 将所有处理过的 TXT 文件移动到 done 目录
-        print("\n" + "="*10 + " 6. 开始移动已处理的 TXT 文件 " + "="*10)
-        move_processed_txt_files(news_directory)
-        print("="*10 + " 完成移动已处理的 TXT 文件 " + "="*10)
-
-        # 7. 将news_images和onews.json备份到相应目录下并更新version.json
-        print("\n" + "="*10 + " 7. 开始备份核心资产 " + "="*10)
-        backup_news_assets(local_server_dir)
-        print("="*10 + " 完成备份核心资产 " + "="*10)
-
-        # 8. 新增：清理超过4天的旧文件和目录
-        print("\n" + "="*10 + " 8. 开始清理旧资产 " + "="*10)
-        prune_old_assets(local_server_dir, days_to_keep=4)
-        print("="*10 + " 完成清理旧资产 " + "="*10)
-
-    else:
-        print("\n错误：PDF转换过程中出现失败，已终止后续所有任务。")
-        print("请检查上面的日志以确定失败原因。")
\ No newline at end of file
+    # PDF 渲染进程数，留一个核给系统
+    pdf_workers = max(1, (os.cpu_count() or 2) - 1)
+    # PDF 分卷：单卷超过 300 页或嵌入 100 MB 图片时另起一卷，平常的量仍是单个 News_X.pdf
+    pdf_part_budget = PdfPartBudget(max_pages=300, max_bytes=100 * 1024 * 1024, max_seconds=0)
+    # 第一阶段同时生成 PDF 和适合手机阅读的 EPUB，两者共用一次解析和同一份图片缓存
+    output_formats = ("pdf", "epub")
+    # 本次运行共用的 JSON 文档缓存；compact=True 时 onews / version.json 输出紧凑格式（不缩进）
+    json_store = JsonDocumentStore(compact=False)
+    # 运行报告（JSON lines）每次都写；排查性能问题时把 profile_stages 打开，按阶段导出 cProfile
+    profile_stages = False
+    recorder = RunRecorder(os.path.join(news_directory, RUN_REPORT_NAME),
+                           os.path.join(news_directory, PROFILE_DIR_NAME) if profile_stages else None)
+
+    # 8 个阶段：TXT 转 PDF、生成 JSON、移动 TodayCNH、清理 Downloads HTML、
+    # 移动 article_copier、移动 TXT、备份核心资产并更新 version.json、清理旧资产。
+    # 进度记录在 journal 中，中途失败后重新运行会从失败的阶段继续。
+    stages = build_news_pipeline(news_directory, article_copier_path, image_dir, downloads_path,
+                                 local_server_dir, today, pdf_workers=pdf_workers, recorder=recorder,
+                                 part_budget=pdf_part_budget, store=json_store, formats=output_formats)
+    runner = PipelineRunner(os.path.join(news_directory, PIPELINE_JOURNAL_NAME), stages, recorder, json_store)
+    runner.run()
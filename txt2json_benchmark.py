@@ -0,0 +1,64 @@
+"""
+URL -> 图片匹配的微基准：旧的双向子串线性扫描 vs UrlImageIndex。
+建索引和查找分开计时，加速比也分两列：含建索引（一次运行的真实开销）和仅查找。
+索引在每次查找时都要 normalize_url，单次查找本身比一次子串比较贵，
+所以总体大约在 250 篇文章以上才开始划算；几十到一两百篇的日常量下两者都只有一两毫秒，
+加速比小于 1x 不代表回退，要看的是文章数增长时线性扫描按平方增长、索引按线性增长。
+"""
+import time
+import random
+import argparse
+
+from txt2json import UrlImageIndex
+
+def build_fixture(n_articles):
+    """
+    构造 n 篇文章的 article_copier 映射和对应的文章 URL（带 query，和 News_*.txt 里一致）。
+    """
+    hosts = ['www.ft.com/content', 'www.wsj.com/articles', 'www.nytimes.com/2025/01/01/world',
+             'www.economist.com/finance/2025/01/01', 'www.bloomberg.com/news/articles']
+    url_images = {}
+    article_urls = []
+    for i in range(n_articles):
+        base = f"https://{hosts[i % len(hosts)]}/story-{i:06d}"
+        url_images[base] = [f"image_{i}_{k}.jpg" for k in range(2)]
+        article_urls.append(f"{base}?mod=hp_lead_pos{i % 7}")
+    random.Random(0).shuffle(article_urls)
+    return url_images, article_urls
+
+def linear_match(url, url_images):
+    # 旧实现：每篇文章和每个 copier URL 做双向子串比较
+    for article_url, images in url_images.items():
+        if url in article_url or article_url in url:
+            return article_url, images
+    return None
+
+def bench(n_articles):
+    url_images, article_urls = build_fixture(n_articles)
+
+    start = time.perf_counter()
+    linear_hits = sum(1 for url in article_urls if linear_match(url, url_images))
+    linear_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = UrlImageIndex(url_images)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    index_hits = sum(1 for url in article_urls if index.lookup(url))
+    lookup_time = time.perf_counter() - start
+
+    assert linear_hits == index_hits == n_articles
+    return linear_time, build_time, lookup_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="URL -> 图片匹配的微基准测试")
+    parser.add_argument('sizes', nargs='*', type=int, default=[100, 250, 1000, 5000])
+    args = parser.parse_args()
+
+    print(f"{'文章数':>8} {'线性匹配(s)':>12} {'建索引(s)':>10} {'索引查找(s)':>12} {'含建索引':>10} {'仅查找':>8}")
+    for n in args.sizes:
+        linear_time, build_time, lookup_time = bench(n)
+        total_speedup = linear_time / max(build_time + lookup_time, 1e-9)
+        lookup_speedup = linear_time / max(lookup_time, 1e-9)
+        print(f"{n:>8} {linear_time:>12.4f} {build_time:>10.4f} {lookup_time:>12.4f} "
+              f"{total_speedup:>9.1f}x {lookup_speedup:>7.1f}x")
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import tempfile
+import argparse
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+import txt2json
+from txt2json import NewsPdfRenderer, PdfPartBudget, PipelineRunner, build_news_pipeline
+
+class RecordingCanvas(txt2json.canvas.Canvas):
+    """
+    记录每个 canvas 上画了哪些文字和图片；save() 之后还在画的内容会被打到这卷文件外面，单独记下来。
+    """
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.saved = False
+        self.drawn = []
+        self.lost = []
+        RecordingCanvas.instances.append(self)
+
+    def _record(self, item):
+        (self.lost if self.saved else self.drawn).append(item)
+
+    def drawString(self, x, y, text, *args, **kwargs):
+        self._record(text)
+        return super().drawString(x, y, text, *args, **kwargs)
+
+    def drawImage(self, image, *args, **kwargs):
+        self._record(os.path.basename(image))
+        return super().drawImage(image, *args, **kwargs)
+
+    def save(self):
+        super().save()
+        self.saved = True
+
+def build_fixture(work_dir, n_sites, images_per_site):
+    """
+    生成 n_sites 个站点、每个站点若干张图片的渲染内容，返回 (content, image_dir, 站点标题列表, 图片文件名列表)。
+    """
+    image_dir = os.path.join(work_dir, "images")
+    os.makedirs(image_dir)
+    lines, titles, images = [], [], []
+    for i in range(n_sites):
+        title = f"FT site {i}"
+        lines.append(title)
+        titles.append(title)
+        for k in range(images_per_site):
+            name = f"image {i} {k}.png"
+            Image.new('RGB', (400, 300), (i * 20 % 256, k * 60 % 256, 90)).save(os.path.join(image_dir, name))
+            lines.append(f"--IMAGE_PLACEHOLDER_{name}--")
+            images.append(name)
+            lines.append(f"Paragraph {i}-{k} " * 20)
+    return '\n'.join(lines), image_dir, titles, images
+
+def check_part_boundaries(budget, n_sites=20, images_per_site=3):
+    """
+    按 budget 分卷渲染，确认每个站点标题和每张图片都落在某一卷里、没有画到已经保存的 canvas 上。
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        content, image_dir, titles, images = build_fixture(work_dir, n_sites, images_per_site)
+        RecordingCanvas.instances = []
+        original_canvas = txt2json.canvas.Canvas
+        txt2json.canvas.Canvas = RecordingCanvas
+        try:
+            renderer = NewsPdfRenderer()
+            renderer.render(content, os.path.join(work_dir, "News_check.pdf"), image_dir,
+                            os.path.join(work_dir, txt2json.IMAGE_CACHE_DIR_NAME), budget)
+        finally:
+            txt2json.canvas.Canvas = original_canvas
+
+        parts = RecordingCanvas.instances
+        drawn = [item for c in parts for item in c.drawn]
+        lost = [item for c in parts for item in c.lost]
+        drawn_images = {os.path.splitext(name)[0] for name in drawn}
+        missing = [t for t in titles if t not in drawn] + \
+                  [name for name in images if os.path.splitext(name)[0] not in drawn_images]
+        # 派生图按内容寻址，drawImage 记录的是缓存文件名，所以图片用图注（去掉扩展名的文件名）来确认
+        ok = not lost and not missing and renderer.stats["images"] == len(images)
+        print(f"{str(tuple(budget)):>16} 分卷 {len(parts):>3}  丢失绘制 {len(lost):>4}  缺失 {len(missing):>3}  "
+              f"{'OK' if ok else 'FAIL'}")
+        for item in (lost + missing)[:5]:
+            print(f"    {item}")
+        return ok
+
+def check_prune_across_days(start=datetime(2025, 3, 10, 8, 0)):
+    """
+    用 build_news_pipeline 里的“清理旧资产”阶段连续运行几天：version.json 不变时，
+    同一天重复运行可以跳过，日期往后推之后必须重新清理，把新过期的资产删掉。
+    """
+    clock = [start]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock[0]
+
+    def asset_names(local_dir):
+        with open(os.path.join(local_dir, "version.json"), 'r', encoding='utf-8') as f:
+            return sorted(item["name"] for item in json.load(f)["files"])
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        local_dir = os.path.join(work_dir, "ONews")
+        files = []
+        for days_ago in (6, 2, 0):
+            name = f"news_images_{(start - timedelta(days=days_ago)).strftime('%y%m%d')}"
+            os.makedirs(os.path.join(local_dir, name))
+            files.append({"name": name, "type": "images"})
+        with open(os.path.join(local_dir, "version.json"), 'w', encoding='utf-8') as f:
+            json.dump({"files": files}, f)
+
+        stages = build_news_pipeline(work_dir, "", work_dir, work_dir, local_dir, start.strftime("%y%m%d"))
+        prune_stage = [stage for stage in stages if stage.name == "清理旧资产"]
+        journal_path = os.path.join(work_dir, txt2json.PIPELINE_JOURNAL_NAME)
+
+        original_datetime = txt2json.datetime
+        txt2json.datetime = FakeDatetime
+        try:
+            steps = []
+            for advance in (0, 0, 3):
+                clock[0] = start + timedelta(days=advance)
+                PipelineRunner(journal_path, prune_stage).run()
+                steps.append(asset_names(local_dir))
+        finally:
+            txt2json.datetime = original_datetime
+
+        expected = [[f["name"] for f in files[1:]], [f["name"] for f in files[1:]], [files[2]["name"]]]
+        ok = steps == expected and sorted(os.listdir(local_dir)) == sorted(
+            [files[2]["name"], "version.json", txt2json.VERSION_INDEX_NAME])
+        print(f"{'跨天清理旧资产':>16} 各次运行后剩余 {[len(names) for names in steps]}  {'OK' if ok else 'FAIL'}")
+        return ok
+
+def check_image_cache_location(workers=2):
+    """
+    完整跑一遍 TXT 转换阶段（PDF + EPUB，进程池），确认派生图缓存和图片摘要只出现在 News 目录的 .image_cache 里，
+    会被备份的图片目录下不产生任何 .image_cache，且缓存里只剩现存图片的派生图。
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        news_dir = os.path.join(work_dir, "News")
+        image_dir = os.path.join(work_dir, "news_images")
+        os.makedirs(news_dir)
+        os.makedirs(image_dir)
+        copier_lines = []
+        for i in range(3):
+            url = f"https://www.ft.com/content/check-{i}"
+            Image.new('RGB', (1600, 900), (i * 70, 40, 90)).save(os.path.join(image_dir, f"image {i}.jpg"))
+            with open(os.path.join(news_dir, f"News_{i}.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"{url}\nFT\nParagraph {i}\n")
+            copier_lines += [url, f"image {i}.jpg"]
+        copier_path = os.path.join(news_dir, "article_copier_check.txt")
+        with open(copier_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(copier_lines) + '\n')
+
+        ok = txt2json.process_all_files(news_dir, copier_path, image_dir, workers=workers, formats=("pdf", "epub"))
+        stray = [root for root, dirs, _ in os.walk(image_dir) for d in dirs if d == txt2json.IMAGE_CACHE_DIR_NAME]
+        cache_dir = os.path.join(news_dir, txt2json.IMAGE_CACHE_DIR_NAME)
+        derivatives = [name for root, _, files in os.walk(cache_dir) if root != cache_dir for name in files]
+        ok = bool(ok) and not stray and len(derivatives) == 3 and \
+            os.path.exists(os.path.join(cache_dir, txt2json.IMAGE_DIGEST_CACHE_NAME))
+        print(f"{'图片缓存位置':>16} 图片目录下的 .image_cache {len(stray)} 个，派生图 {len(derivatives)} 个  "
+              f"{'OK' if ok else 'FAIL'}")
+        return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查 PDF 分卷不丢内容、跨天运行流水线时仍会清理过期资产、图片缓存不落进图片目录")
+    parser.add_argument('--sites', type=int, default=20)
+    parser.add_argument('--images', type=int, default=3, help="每个站点的图片数")
+    args = parser.parse_args()
+
+    budgets = [PdfPartBudget(0, 0, 0), PdfPartBudget(1, 0, 0), PdfPartBudget(3, 0, 0), PdfPartBudget(0, 1, 0)]
+    results = [check_part_boundaries(budget, args.sites, args.images) for budget in budgets]
+    results.append(check_prune_across_days())
+    results.append(check_image_cache_location())
+    sys.exit(0 if all(results) else 1)